@@ -6,7 +6,7 @@ from moviepy.audio.fx.audio_fadeout import audio_fadeout
 from moviepy.audio.fx.audio_fadein import audio_fadein
 from datetime import datetime
 import sys
-from utils import classify_tuples, is_all_zeros, getrandomDuration
+from utils import classify_tuples, is_all_zeros, sample_cuts
 
 dataset_file = "./dataset.csv"
 font_family = './fonts/Anurati-Regular.otf'
@@ -25,8 +25,8 @@ cuts = []
 
 
 def generate_and_classify_cuts(video, cycle, length):
-    for _ in range(cycle):
-        cuts.append(getrandomDuration(video.duration, length))
+    cuts.extend((round(start, 1), round(end, 1))
+                for start, end in sample_cuts(video.duration, cycle, length))
 
     # Remove duplicate cuts
     cts = {tuple(cut): None for cut in cuts}.keys()
@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+"""
+Offline benchmarks for the fx.py commands.
+
+Test sources are generated locally with ffmpeg's lavfi devices (testsrc2
+and sine) at fixed resolutions, frame rates and GOP sizes, so results are
+deterministic and need no network. Every command and every pipeline stage
+runs in its own child process; wall time, output fps, real-time factor
+and peak RSS are collected with os.wait4 and written as JSON.
+
+    python bench.py run                  # all commands and stages
+    python bench.py run --only generate  # one command
+    python bench.py chunks               # encode speedup against --chunks N
+    python bench.py compare old.json new.json
+"""
+import click
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent
+FX = str(REPO_DIR / 'fx.py')
+FONT = str(REPO_DIR / 'fonts' / 'Anurati-Regular.otf')
+FFMPEG = 'ffmpeg.exe' if os.name == 'nt' else 'ffmpeg'
+
+# (name, width, height, fps, gop, seconds)
+SOURCES = [
+    ('360p30_gop30', 640, 360, 30, 30, 60),
+    ('720p30_gop60', 1280, 720, 30, 60, 60),
+    ('1080p24_gop250', 1920, 1080, 24, 250, 60),
+]
+STAGES = ['probe', 'decode', 'composite', 'encode', 'frame_path']
+CHUNK_CASES = ['generate[ffmpeg]', 'bookmarks', 'letterbox']
+
+
+def make_source(media_dir, name, width, height, fps, gop, seconds, variant=0):
+    """Render a deterministic H.264/AAC test clip (cached between runs)."""
+    path = media_dir / f"{name}_{variant}.mp4"
+    if path.exists():
+        return path
+    media_dir.mkdir(parents=True, exist_ok=True)
+    subprocess.run(
+        [FFMPEG, '-hide_banner', '-loglevel', 'error', '-y',
+         '-f', 'lavfi', '-i', f"testsrc2=size={width}x{height}:rate={fps}:duration={seconds}",
+         '-f', 'lavfi', '-i', f"sine=frequency={440 + 110 * variant}:sample_rate=44100:duration={seconds}",
+         '-c:v', 'libx264', '-preset', 'veryfast', '-g', str(gop), '-keyint_min', str(gop),
+         '-sc_threshold', '0', '-pix_fmt', 'yuv420p', '-c:a', 'aac', '-shortest', str(path)],
+        check=True
+    )
+    return path
+
+
+def make_music(media_dir, seconds=180):
+    path = media_dir / 'music.m4a'
+    if not path.exists():
+        media_dir.mkdir(parents=True, exist_ok=True)
+        subprocess.run(
+            [FFMPEG, '-hide_banner', '-loglevel', 'error', '-y',
+             '-f', 'lavfi', '-i', f"sine=frequency=330:sample_rate=44100:duration={seconds}",
+             '-c:a', 'aac', str(path)],
+            check=True
+        )
+    return path
+
+
+def media_info(path):
+    """Duration and frame count of an output file (0 when it is missing)."""
+    if not Path(path).exists():
+        return 0.0, 0
+    result = subprocess.run(
+        [FFMPEG.replace('ffmpeg', 'ffprobe'), '-v', 'error', '-select_streams', 'v:0', '-count_packets',
+         '-show_entries', 'stream=nb_read_packets:format=duration', '-of', 'json', str(path)],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True
+    )
+    data = json.loads(result.stdout)
+    return float(data['format']['duration']), int(data['streams'][0]['nb_read_packets'])
+
+
+def measure(args, cwd):
+    """Run a child process and return (exit code, wall seconds, peak RSS in MiB)."""
+    start = time.perf_counter()
+    proc = subprocess.Popen(args, cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    _, status, usage = os.wait4(proc.pid, 0)
+    wall = time.perf_counter() - start
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    stderr = proc.stderr.read().decode('utf-8', 'replace')
+    proc.stderr.close()
+    # ru_maxrss is KiB on Linux; the child's reaped ffmpeg processes are included
+    peak_rss = usage.ru_maxrss / 1024
+    return proc.returncode, wall, peak_rss, stderr
+
+
+def result_row(kind, name, source, code, wall, peak_rss, output=None, frames=None, duration=None, stderr=''):
+    if output is not None:
+        duration, frames = media_info(output)
+    row = {
+        'kind': kind,
+        'name': name,
+        'source': source,
+        'ok': code == 0,
+        'wall_s': round(wall, 3),
+        'frames': frames,
+        'output_fps': round(frames / wall, 2) if frames and wall else None,
+        'realtime_factor': round(duration / wall, 3) if duration and wall else None,
+        'peak_rss_mb': round(peak_rss, 1),
+    }
+    if code != 0:
+        row['error'] = stderr.strip().splitlines()[-1:] or ['exit code %d' % code]
+    return row
+
+
+def command_cases(work_dir, media_dir, source_name, sources, music):
+    """(name, argv, output path) for every fx.py command on one source group."""
+    src = str(sources[0])
+    out_dir = work_dir / 'out'
+    remix_dir = media_dir / source_name
+    remix_dir.mkdir(exist_ok=True)
+    for source in sources:
+        link = remix_dir / source.name
+        if not link.exists():
+            shutil.copyfile(source, link)
+
+    playlist = work_dir / 'bookmarks.xspf'
+    bookmarks = ','.join(f"{{name=in,time={t}}},{{name=out,time={t + 4}}}" for t in (5, 20, 35, 50))
+    playlist.write_text(
+        f"<playlist><extension><vlc:option>bookmarks={bookmarks}</vlc:option></extension></playlist>",
+        encoding='utf-8'
+    )
+
+    cases = []
+    for engine in ('moviepy', 'copy'):
+        cases.append((f"remix[{engine}]",
+                      [sys.executable, FX, 'remix', str(remix_dir), str(out_dir / f"remix_{engine}"),
+                       '--min-duration', '20', '--max-duration', '20', '--engine', engine],
+                      out_dir / f"remix_{engine}"))
+    for backend in ('moviepy', 'ffmpeg'):
+        config = work_dir / f"generate_{backend}.json"
+        output = out_dir / f"generate_{backend}.mp4"
+        config.write_text(json.dumps({
+            'input_video': src, 'music': str(music), 'cycle': 4, 'cut_size': 5, 'speed': 1.2,
+            'font': FONT, 'seed': 1, 'backend': backend, 'output': str(output),
+        }), encoding='utf-8')
+        cases.append((f"generate[{backend}]",
+                      [sys.executable, FX, 'generate', '--config', str(config)],
+                      out_dir / f"generate_{backend}_1.mp4"))
+    cases.append(('bookmarks',
+                  [sys.executable, FX, 'bookmarks', src, str(playlist), '--output', str(out_dir / 'bookmarks.mp4')],
+                  out_dir / 'bookmarks.mp4'))
+    cases.append(('letterbox',
+                  [sys.executable, FX, 'letterbox', src, str(out_dir / 'letterbox.mp4'), '-s', '2', '-e', '2'],
+                  out_dir / 'letterbox.mp4'))
+    return cases
+
+
+def newest_file(path):
+    """remix writes a random file name into its output directory."""
+    path = Path(path)
+    if path.is_dir():
+        files = sorted(path.glob('*.mp4'), key=lambda f: f.stat().st_mtime)
+        return files[-1] if files else path / 'missing.mp4'
+    return path
+
+
+def write_report(work_dir, results, output=None):
+    """Write results with the commit and host details (default: WORK_DIR/results/<time>_<commit>.json)."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True).stdout.strip()
+    except OSError:
+        commit = ''
+    ffmpeg_version = subprocess.run([FFMPEG, '-version'], stdout=subprocess.PIPE, text=True).stdout.splitlines()[0]
+
+    report = {
+        'commit': commit,
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'host': {
+            'platform': platform.platform(),
+            'python': platform.python_version(),
+            'cpu_count': os.cpu_count(),
+            'ffmpeg': ffmpeg_version,
+        },
+        'results': results,
+    }
+    if not output:
+        results_dir = work_dir / 'results'
+        results_dir.mkdir(parents=True, exist_ok=True)
+        output = results_dir / f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{commit or 'nogit'}.json"
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    click.echo(f"Wrote {output}")
+
+
+@click.group()
+def cli():
+    """Offline benchmark suite for fx.py."""
+    pass
+
+
+@cli.command()
+@click.option('--work-dir', default='./bench', help='Where media, outputs and results go (default: ./bench)')
+@click.option('--only', multiple=True, help='Only run cases whose name starts with this (repeatable)')
+@click.option('--sources', 'source_filter', multiple=True, help='Only use these source names (repeatable)')
+@click.option('--output', '-o', default=None, help='Result JSON path (default: WORK_DIR/results/<time>_<commit>.json)')
+def run(work_dir, only, source_filter, output):
+    """Generate synthetic sources and benchmark every command and stage."""
+    work_dir = Path(work_dir).resolve()
+    media_dir = work_dir / 'media'
+    music = make_music(media_dir)
+
+    results = []
+    for name, width, height, fps, gop, seconds in SOURCES:
+        if source_filter and name not in source_filter:
+            continue
+        click.echo(f"Source {name}: {width}x{height}@{fps} GOP {gop}, {seconds}s")
+        sources = [make_source(media_dir, name, width, height, fps, gop, seconds, variant) for variant in (0, 1)]
+
+        for stage in STAGES:
+            case = f"stage:{stage}"
+            if only and not any(case.startswith(prefix) for prefix in only):
+                continue
+            code, wall, rss, stderr = measure([sys.executable, __file__, 'stage', stage, str(sources[0])], work_dir)
+            payload = {}
+            if code == 0 and stderr.strip():
+                payload = json.loads(stderr.strip().splitlines()[-1])
+            results.append(result_row('stage', stage, name, code, payload.get('wall_s', wall), rss,
+                                      frames=payload.get('frames'), duration=payload.get('duration'),
+                                      stderr=stderr))
+            results[-1].update({k: v for k, v in payload.items() if k not in ('wall_s', 'frames', 'duration')})
+            line = f"  {case:<20} {results[-1]['wall_s']:>8.2f}s  {results[-1]['peak_rss_mb']:>7.1f} MiB"
+            if 'allocation_free' in payload:
+                line += f"  steady-state alloc peak {payload['steady_alloc_peak_bytes']} B"
+                line += "" if payload['allocation_free'] else " (NOT allocation-free)"
+            click.echo(line)
+
+        for case, args, out in command_cases(work_dir, media_dir, name, sources, music):
+            if only and not any(case.startswith(prefix) for prefix in only):
+                continue
+            shutil.rmtree(work_dir / 'cache', ignore_errors=True)  # Cold caches for every run
+            shutil.rmtree(work_dir / 'out', ignore_errors=True)
+            (work_dir / 'out').mkdir(parents=True)
+            code, wall, rss, stderr = measure(args, work_dir)
+            results.append(result_row('command', case, name, code, wall, rss, output=newest_file(out), stderr=stderr))
+            click.echo(f"  {case:<20} {wall:>8.2f}s  {rss:>7.1f} MiB  rtf={results[-1]['realtime_factor']}")
+
+    write_report(work_dir, results, output)
+
+
+@cli.command()
+@click.option('--work-dir', default='./bench', help='Where media, outputs and results go (default: ./bench)')
+@click.option('--counts', default=None,
+              help='Comma-separated chunk counts to sweep (default: 1,2,4,8 and the CPU core count)')
+@click.option('--only', multiple=True, help=f"Only run cases whose name starts with this (of {', '.join(CHUNK_CASES)})")
+@click.option('--sources', 'source_filter', multiple=True, help='Only use these source names (repeatable)')
+@click.option('--output', '-o', default=None, help='Result JSON path (default: WORK_DIR/results/<time>_<commit>.json)')
+def chunks(work_dir, counts, only, source_filter, output):
+    """Benchmark the encoding commands against --chunks N and report the speedup over one chunk."""
+    work_dir = Path(work_dir).resolve()
+    media_dir = work_dir / 'media'
+    music = make_music(media_dir)
+    if counts:
+        counts = sorted({int(count) for count in counts.split(',')})
+    else:
+        counts = sorted({1, 2, 4, 8, os.cpu_count() or 1})
+    click.echo(f"{os.cpu_count()} CPU cores, chunk counts {counts}")
+
+    results = []
+    for name, width, height, fps, gop, seconds in SOURCES:
+        if source_filter and name not in source_filter:
+            continue
+        click.echo(f"Source {name}: {width}x{height}@{fps} GOP {gop}, {seconds}s")
+        sources = [make_source(media_dir, name, width, height, fps, gop, seconds, variant) for variant in (0, 1)]
+
+        for case, args, out in command_cases(work_dir, media_dir, name, sources, music):
+            if case not in CHUNK_CASES or (only and not any(case.startswith(prefix) for prefix in only)):
+                continue
+            baseline = None
+            for count in counts:
+                shutil.rmtree(work_dir / 'cache', ignore_errors=True)  # Cold caches for every run
+                shutil.rmtree(work_dir / 'out', ignore_errors=True)
+                (work_dir / 'out').mkdir(parents=True)
+                code, wall, rss, stderr = measure(args + ['--chunks', str(count)], work_dir)
+                row = result_row('chunks', f"{case}[chunks={count}]", name, code, wall, rss,
+                                 output=newest_file(out), stderr=stderr)
+                row['chunks'] = count
+                if count == counts[0] and row['ok']:
+                    baseline = wall
+                row['speedup'] = round(baseline / wall, 2) if baseline and row['ok'] else None
+                results.append(row)
+                click.echo(f"  {case + ' x' + str(count):<24} {wall:>8.2f}s  {rss:>7.1f} MiB  "
+                           f"frames={row['frames']}  speedup={row['speedup']}")
+
+    write_report(work_dir, results, output)
+
+
+@cli.command()
+@click.argument('stage', type=click.Choice(STAGES))
+@click.argument('source')
+def stage(stage, source):
+    """Run one pipeline stage in isolation (used by `run`; prints JSON to stderr)."""
+    sys.path.insert(0, str(REPO_DIR))
+    import fx
+    import moviepy.editor as mpy
+    import numpy as np
+
+    frames, duration = 0, 0.0
+    extra = {}
+    start = time.perf_counter()
+    if stage == 'probe':
+        cache = fx.ProbeCache(cache_file=os.path.join('cache', 'bench_probe.jsonl'))
+        info = cache._run_ffprobe(source)
+        frames, duration = len(info['keyframes']), info['duration']
+    elif stage == 'decode':
+        clip = mpy.VideoFileClip(source, audio=False)
+        duration = clip.duration
+        for _ in clip.iter_frames():
+            frames += 1
+        clip.close()
+    elif stage == 'composite':
+        info = fx.ProbeCache(cache_file=os.path.join('cache', 'bench_probe.jsonl'))._run_ffprobe(source)
+        rgba = fx.LogoCache.render('UTOPIA', FONT, 30, 'white', 0.7)
+        renderer = fx.EditRenderer(source, info, [(0.0, 10.0)], 1.0, True, rgba, (60, 60), fps=info['fps'])
+        frame = np.empty((renderer.size[1], renderer.size[0], 3), dtype=np.uint8)
+        start = time.perf_counter()
+        for n in range(renderer.nframes):
+            renderer.render_into(n, frame)
+            frames += 1
+        duration = renderer.duration
+        renderer.close()
+    elif stage == 'frame_path':
+        # Decode, composite and pipe to the encoder; allocations are traced after a warm-up
+        info = fx.ProbeCache(cache_file=os.path.join('cache', 'bench_probe.jsonl'))._run_ffprobe(source)
+        rgba = fx.LogoCache.render('UTOPIA', FONT, 30, 'white', 0.7)
+        renderer = fx.EditRenderer(source, info, [(0.0, 10.0)], 1.0, True, rgba, (60, 60), fps=info['fps'])
+        os.makedirs('out', exist_ok=True)
+        warmup = 5  # Decoder start-up; the fade-in still runs in the traced part
+        with fx.FrameWriter(os.path.join('out', 'frame_path.mp4'), renderer.size, info['fps']) as writer:
+            for n in range(warmup):
+                renderer.render_into(n, writer.frame)
+                writer.write()
+            tracemalloc.start()
+            base = tracemalloc.get_traced_memory()[0]
+            for n in range(warmup, renderer.nframes):
+                renderer.render_into(n, writer.frame)
+                writer.write()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        frames, duration = renderer.nframes, renderer.duration
+        renderer.close()
+        extra['steady_alloc_peak_bytes'] = peak - base
+        extra['steady_alloc_growth_bytes'] = current - base
+        extra['frame_bytes'] = writer.frame.nbytes
+        extra['allocation_free'] = peak - base < writer.frame.nbytes
+    elif stage == 'encode':
+        info = fx.ProbeCache(cache_file=os.path.join('cache', 'bench_probe.jsonl'))._run_ffprobe(source)
+        duration = 10.0
+        subprocess.run(
+            [FFMPEG, '-hide_banner', '-loglevel', 'error', '-y',
+             '-f', 'lavfi', '-i', f"testsrc2=size={info['width']}x{info['height']}:rate={info['fps']}:duration={duration}",
+             '-c:v', 'libx264', '-preset', 'ultrafast', '-crf', '30', '-f', 'null', '-'],
+            check=True
+        )
+        frames = int(round(duration * info['fps']))
+    wall = time.perf_counter() - start
+    click.echo(json.dumps({'wall_s': wall, 'frames': frames, 'duration': duration, **extra}), err=True)
+
+
+@cli.command()
+@click.argument('baseline')
+@click.argument('current')
+def compare(baseline, current):
+    """Compare two result files case by case (wall time and peak RSS ratios)."""
+    with open(baseline, 'r', encoding='utf-8') as f:
+        old = {(r['kind'], r['name'], r['source']): r for r in json.load(f)['results']}
+    with open(current, 'r', encoding='utf-8') as f:
+        new = json.load(f)['results']
+
+    click.echo(f"{'case':<32} {'base s':>9} {'new s':>9} {'speedup':>8} {'rss':>7}")
+    for row in new:
+        key = (row['kind'], row['name'], row['source'])
+        if key not in old or not old[key]['ok'] or not row['ok']:
+            continue
+        base = old[key]
+        speedup = base['wall_s'] / row['wall_s'] if row['wall_s'] else float('inf')
+        rss_ratio = row['peak_rss_mb'] / base['peak_rss_mb'] if base['peak_rss_mb'] else float('nan')
+        click.echo(f"{row['source'] + ' ' + row['name']:<32} {base['wall_s']:>9.2f} {row['wall_s']:>9.2f} "
+                   f"{speedup:>7.2f}x {rss_ratio:>6.2f}x")
+
+
+if __name__ == "__main__":
+    cli()
@@ -1,43 +1,361 @@
 #!/usr/bin/env python3
 import click
+import cProfile
+import errno
+import hashlib
 import json
 import logging
 import os
 import sys
 import shutil
+import socket
+import sqlite3
 import re
 import random
 import subprocess
+import tempfile
+import threading
+import time
 import uuid
+from bisect import bisect_left, bisect_right
 from datetime import datetime
 from itertools import batched
 from pathlib import Path
 from typing import List, Tuple, Dict, Set
 from dataclasses import dataclass
-from collections import defaultdict
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 
+import numpy as np
 import moviepy.editor as mpy
-from moviepy.video.fx.all import rotate, speedx
-from moviepy.audio.fx.all import audio_fadeout, audio_fadein
 from moviepy.config import change_settings
-from moviepy.editor import VideoFileClip, CompositeVideoClip, ColorClip, concatenate_videoclips
+from moviepy.editor import VideoClip
+from moviepy.video.io.ffmpeg_reader import FFMPEG_VideoReader
+from PIL import Image, ImageColor, ImageDraw, ImageFont
 from tqdm import tqdm
 
-# Utility functions
-def getrandomDuration(video_duration, cut_length):
-    """Generate a random start time and return (start, start+cut_length) tuple."""
-    max_start = max(0, video_duration - cut_length)
-    start = random.uniform(0, max_start)
-    end = min(start + cut_length, video_duration)
-    return (start, end)
-
-def detect_overlapping_tuples(cuts):
-    """Check if any time ranges overlap."""
-    sorted_cuts = sorted(cuts, key=lambda x: x[0])
-    for i in range(len(sorted_cuts) - 1):
-        if sorted_cuts[i][1] > sorted_cuts[i + 1][0]:
-            return True
-    return False
+from utils import classify_cut_sets, load_cut_dataset, sample_cuts
+
+# Profiling
+class SpanRecorder:
+    """
+    Lightweight per-stage timings.
+
+    Each span records its duration plus optional frame and byte counts and
+    is appended as a JSON line to ./logs/spans_<command>_<time>.jsonl;
+    report() aggregates them per stage at the end of a run.
+    """
+
+    def __init__(self):
+        self.records: List[dict] = []
+        self.log_file = None
+        self.command = None
+
+    def start(self, command: str, log_dir: str = './logs'):
+        os.makedirs(log_dir, exist_ok=True)
+        self.command = command
+        self.log_file = os.path.join(
+            log_dir, f"spans_{command}_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{os.getpid()}.jsonl"
+        )
+
+    @contextmanager
+    def span(self, name: str, **fields):
+        """Time a stage; the yielded dict can be filled with 'frames' / 'bytes' before it closes."""
+        record = {'span': name, **fields}
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['duration_s'] = round(time.perf_counter() - start, 6)
+            self.add(record)
+
+    def add(self, record: dict):
+        record.setdefault('command', self.command)
+        record.setdefault('pid', os.getpid())
+        self.records.append(record)
+        if self.log_file:
+            with open(self.log_file, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, default=str) + "\n")
+
+    def report(self):
+        """Print total time, call count, frames and bytes per stage."""
+        if not self.records:
+            return
+        totals = defaultdict(lambda: {'count': 0, 'seconds': 0.0, 'frames': 0, 'bytes': 0})
+        for record in self.records:
+            total = totals[record['span']]
+            total['count'] += 1
+            total['seconds'] += record['duration_s']
+            total['frames'] += record.get('frames') or 0
+            total['bytes'] += record.get('bytes') or 0
+
+        click.echo("Stage timings:")
+        for name, total in sorted(totals.items(), key=lambda item: -item[1]['seconds']):
+            line = f"  {name:<20} {total['seconds']:>9.3f}s  x{total['count']}"
+            if total['frames']:
+                line += f"  {total['frames']} frames ({total['frames'] / max(total['seconds'], 1e-9):.1f} fps)"
+            if total['bytes']:
+                line += f"  {total['bytes'] / 1e6:.1f} MB"
+            click.echo(line)
+        if self.log_file:
+            click.echo(f"Spans written to: {self.log_file}")
+
+spans = SpanRecorder()
+
+def output_size(path) -> int:
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+# Media probing
+FFMPEG_BINARY = 'ffmpeg.exe' if os.name == 'nt' else 'ffmpeg'
+FFPROBE_BINARY = 'ffprobe.exe' if os.name == 'nt' else 'ffprobe'
+
+class ProbeCache:
+    """
+    On-disk cache of ffprobe metadata keyed by (path, size, mtime).
+
+    One ffprobe pass per file collects duration, fps, resolution, codec and
+    audio presence, and a second reads the packet flags of the first video
+    stream for its keyframe timestamps, so commands can plan cuts without
+    opening a decoder. The cache file is JSON lines: new entries are
+    appended, the last line for a path wins, and the file is compacted on
+    load once superseded lines outnumber live ones.
+    """
+
+    def __init__(self, cache_file: str = './cache/probe_cache.jsonl', ffprobe_path: str = FFPROBE_BINARY):
+        self.cache_file = cache_file
+        self.ffprobe_path = ffprobe_path
+        self.entries: Dict[str, dict] = {}
+        self.dirty: Set[str] = set()
+        self.lock = threading.Lock()
+        if os.path.exists(cache_file):
+            lines = 0
+            try:
+                with open(cache_file, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        try:
+                            record = json.loads(line)
+                            self.entries[record['path']] = record['entry']
+                            lines += 1
+                        except (ValueError, KeyError, TypeError):
+                            continue  # A line cut short by a crash
+            except OSError as e:
+                logging.warning(f"Ignoring unreadable probe cache {cache_file}: {str(e)}")
+            if lines > 2 * len(self.entries) + 100:
+                self.compact()
+
+    @staticmethod
+    def _parse_rate(rate: str) -> float:
+        num, _, den = (rate or '0/1').partition('/')
+        try:
+            return float(num) / float(den or 1)
+        except (ValueError, ZeroDivisionError):
+            return 0.0
+
+    def _run_ffprobe(self, path: str) -> dict:
+        result = subprocess.run(
+            [self.ffprobe_path, '-v', 'error',
+             '-show_entries',
+             'format=duration:stream=index,codec_type,codec_name,width,height,pix_fmt,avg_frame_rate,r_frame_rate,'
+             'time_base',
+             '-of', 'json=compact=1', path],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True
+        )
+        data = json.loads(result.stdout)
+        streams = data.get('streams', [])
+        video = next((st for st in streams if st.get('codec_type') == 'video'), None)
+        if video is None:
+            raise ValueError(f"No video stream in {path}")
+
+        # Only the video stream's packets, as compact "pts_time,flags" lines (no decoding)
+        packets = subprocess.run(
+            [self.ffprobe_path, '-v', 'error', '-select_streams', 'v:0',
+             '-show_entries', 'packet=pts_time,flags', '-of', 'csv=p=0', path],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True, text=True
+        ).stdout
+        keyframes = []
+        for line in packets.splitlines():
+            pts_time, _, flags = line.partition(',')
+            if 'K' in flags and pts_time not in ('', 'N/A'):
+                keyframes.append(float(pts_time))
+        keyframes.sort()
+        return {
+            'duration': float(data['format']['duration']),
+            'fps': self._parse_rate(video.get('avg_frame_rate')) or self._parse_rate(video.get('r_frame_rate')),
+            'width': video.get('width'),
+            'height': video.get('height'),
+            'codec': video.get('codec_name'),
+            'pix_fmt': video.get('pix_fmt'),
+            'time_base': video.get('time_base'),
+            'has_audio': any(st.get('codec_type') == 'audio' for st in streams),
+            'keyframes': keyframes or [0.0],
+        }
+
+    def probe(self, path: str) -> dict:
+        """Return cached metadata for a media file, running ffprobe only if it changed."""
+        path = str(Path(path).resolve())
+        stat = os.stat(path)
+        entry = self.entries.get(path)
+        if entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+            return entry['info']
+
+        logging.info(f"Probing media: {path}")
+        with spans.span('probe', path=path):
+            info = self._run_ffprobe(path)
+        with self.lock:
+            self.entries[path] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'info': info}
+            self.dirty.add(path)
+        return info
+
+    def probe_many(self, paths: List[str], max_workers: int = 8) -> Dict[str, dict]:
+        """Probe a whole folder in parallel (ffprobe is I/O bound) and persist the results."""
+        results = {}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(self.probe, path): path for path in paths}
+            for future in as_completed(futures):
+                path = futures[future]
+                try:
+                    results[path] = future.result()
+                except Exception as e:
+                    logging.warning(f"Failed to probe {path}: {str(e)}")
+        self.save()
+        return results
+
+    def save(self):
+        """Append new entries to the cache file (one line each, a single write)."""
+        with self.lock:
+            if not self.dirty:
+                return
+            lines = ''.join(json.dumps({'path': path, 'entry': self.entries[path]}) + "\n" for path in self.dirty)
+            self.dirty.clear()
+        os.makedirs(os.path.dirname(self.cache_file) or '.', exist_ok=True)
+        with open(self.cache_file, 'a', encoding='utf-8') as f:
+            f.write(lines)
+
+    def compact(self):
+        """Rewrite the cache file with one line per path, replacing it atomically."""
+        tmp_file = f"{self.cache_file}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                for path, entry in self.entries.items():
+                    f.write(json.dumps({'path': path, 'entry': entry}) + "\n")
+            os.replace(tmp_file, self.cache_file)
+        except OSError as e:
+            logging.warning(f"Could not compact probe cache {self.cache_file}: {str(e)}")
+
+_probe_cache = None
+
+def get_probe_cache() -> ProbeCache:
+    """Process-wide probe cache shared by all commands."""
+    global _probe_cache
+    if _probe_cache is None:
+        _probe_cache = ProbeCache()
+    return _probe_cache
+
+def probe_media(path: str) -> dict:
+    """Probe a single file through the shared cache and persist the entry."""
+    cache = get_probe_cache()
+    info = cache.probe(path)
+    cache.save()
+    return info
+
+# Cut history
+class CutHistory:
+    """
+    SQLite store with one row per used cut (source, start, end, speed,
+    output, command, timestamp), indexed on (source, start) so questions
+    like "which ranges of this episode were already used" are an index
+    lookup. WAL mode lets parallel generate jobs write concurrently.
+    """
+
+    def __init__(self, db_path: str = './cache/cut_history.sqlite'):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        with self.connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cuts ("
+                " id INTEGER PRIMARY KEY,"
+                " source TEXT NOT NULL,"
+                " start REAL NOT NULL,"
+                " end REAL NOT NULL,"
+                " speed REAL NOT NULL DEFAULT 1.0,"
+                " output TEXT,"
+                " command TEXT NOT NULL,"
+                " created_at TEXT NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_cuts_source_start ON cuts (source, start)")
+
+    @contextmanager
+    def connect(self):
+        """Open a connection, commit on success, and always close it."""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def record(self, cuts: List[Tuple[str, float, float, float]], output: str, command: str):
+        """Insert (source, start, end, speed) rows for one output in a single transaction."""
+        created_at = datetime.now().isoformat(timespec='seconds')
+        rows = [
+            (str(Path(source).resolve()), float(start), float(end), float(speed), output, command, created_at)
+            for source, start, end, speed in cuts
+        ]
+        with self.connect() as conn:
+            conn.executemany(
+                "INSERT INTO cuts (source, start, end, speed, output, command, created_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+
+    def used_ranges(self, source: str, start: float = 0.0, end: float = float('inf')) -> List[Tuple[float, float]]:
+        """Used (start, end) ranges of a source that intersect [start, end], in time order."""
+        with self.connect() as conn:
+            return conn.execute(
+                "SELECT start, end FROM cuts WHERE source = ? AND start < ? AND end > ? ORDER BY start",
+                (str(Path(source).resolve()), end, start)
+            ).fetchall()
+
+    def import_csv(self, csv_path: str, source: str, batch_size: int = 10000) -> int:
+        """Import a legacy dataset.csv (one cut list per row) attributing every cut to `source`."""
+        starts, ends, _, _ = load_cut_dataset(csv_path)
+        source = str(Path(source).resolve())
+        created_at = datetime.fromtimestamp(os.path.getmtime(csv_path)).isoformat(timespec='seconds')
+        valid = ~np.isnan(starts)
+        rows = [
+            (source, float(s), float(e), 1.0, None, 'edit.py', created_at)
+            for s, e in zip(starts[valid], ends[valid])
+        ]
+        with self.connect() as conn:
+            for batch in range(0, len(rows), batch_size):
+                conn.executemany(
+                    "INSERT INTO cuts (source, start, end, speed, output, command, created_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    rows[batch:batch + batch_size]
+                )
+        return len(rows)
+
+_cut_history = None
+
+def get_cut_history() -> CutHistory:
+    """Process-wide cut history store."""
+    global _cut_history
+    if _cut_history is None:
+        _cut_history = CutHistory()
+    return _cut_history
+
+def record_cuts(cuts: List[Tuple[str, float, float, float]], output: str, command: str):
+    """Record the cuts behind an output; history problems never fail a render."""
+    try:
+        get_cut_history().record(cuts, output, command)
+    except sqlite3.Error as e:
+        logging.warning(f"Could not record cut history: {str(e)}")
 
 # Classes for the remix command
 @dataclass
@@ -50,37 +368,535 @@ class TimeRange:
         return (self.start <= other.end and self.end >= other.start)
 
 class UsedSegments:
+    """Used time ranges per video, kept as sorted, merged (disjoint) intervals.
+
+    Parallel ``starts``/``ends`` lists make availability checks a bisect
+    (O(log n)). The free gaps between them (for one clip duration and
+    min_gap per video) are kept alongside and cut down in place as
+    segments are added, so sampling never rebuilds them.
+    """
+
     def __init__(self):
-        self.segments: Dict[str, List[TimeRange]] = defaultdict(list)
+        self.starts: Dict[str, List[float]] = defaultdict(list)
+        self.ends: Dict[str, List[float]] = defaultdict(list)
+        # video -> (clip_duration, min_gap, gap starts, gap ends)
+        self.gaps: Dict[str, Tuple[float, float, List[float], List[float]]] = {}
 
     def add_segment(self, video_path: str, start: float, end: float):
-        """Add a used time range for a video."""
-        self.segments[video_path].append(TimeRange(start, end))
+        """Add a used time range for a video, merging it with any ranges it touches."""
+        starts, ends = self.starts[video_path], self.ends[video_path]
+
+        # Intervals i..j-1 overlap or touch [start, end]
+        i = bisect_left(ends, start)
+        j = bisect_right(starts, end)
+        if i < j:
+            start = min(start, starts[i])
+            end = max(end, ends[j - 1])
+        starts[i:j] = [start]
+        ends[i:j] = [end]
+
+        if video_path in self.gaps:
+            _, min_gap, gap_starts, gap_ends = self.gaps[video_path]
+            low, high = start - min_gap, end + min_gap
+            # Gaps i..j-1 overlap the padded range; keep what is left on either side
+            i = bisect_right(gap_ends, low)
+            j = bisect_left(gap_starts, high)
+            if i < j:
+                left = [(gap_starts[i], low)] if gap_starts[i] < low else []
+                right = [(high, gap_ends[j - 1])] if gap_ends[j - 1] > high else []
+                gap_starts[i:j] = [gap_start for gap_start, _ in left + right]
+                gap_ends[i:j] = [gap_end for _, gap_end in left + right]
+
+    def add_ranges(self, video_path: str, starts, ends):
+        """Bulk-merge many used ranges (e.g. loaded history) with one sort instead of n inserts."""
+        if len(starts) == 0:
+            return
+        all_starts = np.concatenate([self.starts[video_path], np.asarray(starts, dtype=np.float64)])
+        all_ends = np.concatenate([self.ends[video_path], np.asarray(ends, dtype=np.float64)])
+        order = np.argsort(all_starts, kind='stable')
+        all_starts, all_ends = all_starts[order], all_ends[order]
+
+        # A range opens a new merged interval when it starts after everything before it ended
+        new_group = np.empty(len(all_starts), dtype=bool)
+        new_group[0] = True
+        new_group[1:] = all_starts[1:] > np.maximum.accumulate(all_ends)[:-1]
+        group_starts = np.flatnonzero(new_group)
+        self.starts[video_path] = all_starts[group_starts].tolist()
+        self.ends[video_path] = np.maximum.reduceat(all_ends, group_starts).tolist()
+        self.gaps.pop(video_path, None)  # Rebuilt on the next lookup
 
     def is_available(self, video_path: str, start: float, end: float, min_gap: float = 0.5) -> bool:
         """
         Check if a time range is available for use.
         min_gap: minimum gap required between segments (in seconds)
         """
-        new_range = TimeRange(start - min_gap, end + min_gap)
-        return not any(
-            existing.overlaps(new_range)
-            for existing in self.segments[video_path]
+        starts, ends = self.starts[video_path], self.ends[video_path]
+        i = bisect_left(ends, start - min_gap)  # first used range ending at/after the padded start
+        return i == len(starts) or starts[i] > end + min_gap
+
+    def free_gaps(self, video_path: str, clip_duration: float, min_gap: float = 0.5) -> List[Tuple[float, float]]:
+        """Unused (start, end) regions of the video, already shrunk by min_gap around used ranges."""
+        return list(zip(*self._gap_lists(video_path, clip_duration, min_gap)))
+
+    def _gap_lists(self, video_path: str, clip_duration: float, min_gap: float) -> Tuple[List[float], List[float]]:
+        """
+        Live starts/ends lists of the free gaps, built once per
+        (clip_duration, min_gap) and then kept up to date by add_segment.
+        """
+        cached = self.gaps.get(video_path)
+        if cached is not None and cached[:2] == (clip_duration, min_gap):
+            return cached[2], cached[3]
+
+        gap_starts, gap_ends = [], []
+        cursor = 0.0
+        for used_start, used_end in zip(self.starts[video_path], self.ends[video_path]):
+            gap_end = min(used_start - min_gap, clip_duration)
+            if gap_end > cursor:
+                gap_starts.append(cursor)
+                gap_ends.append(gap_end)
+            cursor = max(cursor, used_end + min_gap)
+        if clip_duration > cursor:
+            gap_starts.append(cursor)
+            gap_ends.append(clip_duration)
+        self.gaps[video_path] = (clip_duration, min_gap, gap_starts, gap_ends)
+        return gap_starts, gap_ends
+
+    def get_available_duration(self, video_path: str, clip_duration: float, min_gap: float = 0.5) -> float:
+        """Calculate total available duration excluding used segments and their min_gap margins."""
+        gap_starts, gap_ends = self._gap_lists(video_path, clip_duration, min_gap)
+        return sum(gap_ends) - sum(gap_starts)
+
+    def longest_free_gap(self, video_path: str, clip_duration: float, min_gap: float = 0.5) -> float:
+        """Length of the longest segment that can still be placed in the video."""
+        gap_starts, gap_ends = self._gap_lists(video_path, clip_duration, min_gap)
+        return max((end - start for start, end in zip(gap_starts, gap_ends)), default=0.0)
+
+    def sample_start(self, video_path: str, clip_duration: float, length: float, min_gap: float = 0.5) -> float:
+        """
+        Draw a start time uniformly over every position where a segment of
+        `length` fits, by picking a free gap weighted by its slack.
+        """
+        candidates = [
+            (start, end - length)
+            for start, end in zip(*self._gap_lists(video_path, clip_duration, min_gap))
+            if end - start >= length
+        ]
+        if not candidates:
+            raise ValueError(f"No free gap of {length:.2f}s left")
+
+        weights = [last - first for first, last in candidates]
+        if sum(weights) <= 0:
+            return random.choice(candidates)[0]
+        first, last = random.choices(candidates, weights=weights)[0]
+        return random.uniform(first, last)
+
+def content_fingerprint(path: str, chunk: int = 1 << 20) -> str:
+    """Hash of a file's size plus its first and last `chunk` bytes (survives renames and moves, cheap on big files)."""
+    size = os.path.getsize(path)
+    digest = hashlib.sha1(str(size).encode('ascii'))
+    with open(path, 'rb') as f:
+        digest.update(f.read(chunk))
+        if size > chunk:
+            f.seek(max(chunk, size - chunk))
+            digest.update(f.read(chunk))
+    return digest.hexdigest()
+
+class UsedSegmentStore:
+    """
+    Used ranges persisted across remix runs, one compact .npy file per source.
+
+    Sources are keyed by a content fingerprint (size plus hashes of the
+    first and last MiB), so renamed or moved files keep their history.
+    Each file is a structured (start, end, used_at) float64 array that
+    loads in milliseconds; entries older than `expiry_days` are dropped.
+    """
+
+    DTYPE = np.dtype([('start', '<f8'), ('end', '<f8'), ('used_at', '<f8')])
+    CHUNK = 1 << 20
+
+    def __init__(self, store_dir: str = './cache/used_segments', expiry_days: float = 30.0):
+        self.store_dir = store_dir
+        self.expiry_days = expiry_days
+        self.fingerprints: Dict[str, str] = {}
+
+    def fingerprint(self, video_path: str) -> str:
+        if video_path not in self.fingerprints:
+            self.fingerprints[video_path] = content_fingerprint(video_path, self.CHUNK)
+        return self.fingerprints[video_path]
+
+    def path_for(self, video_path: str) -> str:
+        return os.path.join(self.store_dir, f"{self.fingerprint(video_path)}.npy")
+
+    def load(self, video_path: str) -> np.ndarray:
+        """Unexpired used ranges of a source (empty array if it has no history)."""
+        path = self.path_for(video_path)
+        if not os.path.exists(path):
+            return np.empty(0, dtype=self.DTYPE)
+        ranges = np.load(path)
+        if self.expiry_days > 0:
+            ranges = ranges[ranges['used_at'] >= time.time() - self.expiry_days * 86400]
+        return ranges
+
+    def load_into(self, used_segments: UsedSegments, video_paths: List[str]):
+        """Seed a run's UsedSegments with every source's persisted history."""
+        for video_path in video_paths:
+            try:
+                ranges = self.load(video_path)
+            except (OSError, ValueError) as e:
+                logging.warning(f"Ignoring used-segment history of {video_path}: {str(e)}")
+                continue
+            if len(ranges):
+                logging.info(f"Loaded {len(ranges)} previously used ranges for {Path(video_path).name}")
+                used_segments.add_ranges(video_path, ranges['start'], ranges['end'])
+
+    def save(self, video_path: str, new_ranges: List[Tuple[float, float]]):
+        """Append this run's ranges to a source's history (expired entries are compacted away)."""
+        if not new_ranges:
+            return
+        added = np.empty(len(new_ranges), dtype=self.DTYPE)
+        added['start'] = [start for start, _ in new_ranges]
+        added['end'] = [end for _, end in new_ranges]
+        added['used_at'] = time.time()
+        ranges = np.concatenate([self.load(video_path), added])
+
+        os.makedirs(self.store_dir, exist_ok=True)
+        path = self.path_for(video_path)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.save(f, ranges)
+        os.replace(tmp_path, path)
+
+class SceneIndex:
+    """
+    Shot boundaries and unusable (blank or static) stretches of each source.
+
+    Every source is decoded once by ffmpeg at a tiny grayscale proxy
+    resolution and low fps; blank frames (nearly uniform, e.g. black),
+    static runs (title cards, freeze frames) and shot cuts are found with
+    vectorized NumPy frame differencing. Results are saved per file under
+    ./cache/scenes and reused until the file's size or mtime changes.
+    """
+
+    def __init__(self, cache_dir: str = './cache/scenes', fps: float = 2.0, size: Tuple[int, int] = (64, 36),
+                 blank_std: float = 6.0, static_diff: float = 0.8, static_seconds: float = 2.0,
+                 cut_diff: float = 25.0, cut_ratio: float = 3.0):
+        self.cache_dir = cache_dir
+        self.fps = fps
+        self.size = size
+        self.blank_std = blank_std
+        self.static_diff = static_diff
+        self.static_seconds = static_seconds
+        self.cut_diff = cut_diff
+        self.cut_ratio = cut_ratio
+
+    def path_for(self, video_path: str) -> str:
+        key = hashlib.sha1(str(Path(video_path).resolve()).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.npz")
+
+    def decode_proxy(self, video_path: str) -> np.ndarray:
+        """(frames, height, width) uint8 luma at proxy size and fps."""
+        width, height = self.size
+        result = subprocess.run(
+            [FFMPEG_BINARY, '-hide_banner', '-loglevel', 'error', '-i', video_path, '-an',
+             '-vf', f"fps={self.fps},scale={width}:{height}:flags=area", '-pix_fmt', 'gray',
+             '-f', 'rawvideo', '-'],
+            stdout=subprocess.PIPE, check=True
         )
+        return np.frombuffer(result.stdout, dtype=np.uint8).reshape(-1, height, width)
+
+    @staticmethod
+    def runs(mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Start and end indices (end exclusive) of the True runs of a boolean array."""
+        edges = np.diff(np.concatenate([[0], mask.astype(np.int8), [0]]))
+        return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+    def analyze(self, frames: np.ndarray) -> Dict[str, np.ndarray]:
+        """Shot boundaries (seconds) and unusable (start, end) ranges of a proxy frame stack."""
+        flat = frames.reshape(len(frames), -1).astype(np.float32)
+        blank = flat.std(axis=1) < self.blank_std
+
+        diffs = np.abs(np.diff(flat, axis=0)).mean(axis=1)  # diffs[i] is frame i -> i + 1
+        static_pairs = diffs < self.static_diff
+        static = np.zeros(len(flat), dtype=bool)
+        min_run = max(1, int(round(self.static_seconds * self.fps)))
+        for start, end in zip(*self.runs(static_pairs)):
+            if end - start >= min_run:
+                static[start:end + 1] = True
+
+        # A cut is a difference spike well above the typical motion around it
+        window = 9
+        padded = np.pad(diffs, window // 2, mode='edge')
+        local = np.median(np.lib.stride_tricks.sliding_window_view(padded, window), axis=1)
+        cuts = np.flatnonzero((diffs > self.cut_diff) & (diffs > self.cut_ratio * local) & ~blank[1:] & ~blank[:-1])
+
+        starts, ends = self.runs(blank | static)
+        return {
+            'boundaries': (cuts + 1) / self.fps,
+            'unusable': np.stack([starts / self.fps, ends / self.fps], axis=1),
+            'duration': np.float64(len(flat) / self.fps),
+        }
+
+    def get(self, video_path: str) -> Dict[str, np.ndarray]:
+        """Cached analysis of a source, decoding its proxy only when the file changed."""
+        stat = os.stat(video_path)
+        path = self.path_for(video_path)
+        if os.path.exists(path):
+            try:
+                with np.load(path) as cached:
+                    if int(cached['size']) == stat.st_size and int(cached['mtime_ns']) == stat.st_mtime_ns:
+                        return {name: cached[name] for name in ('boundaries', 'unusable', 'duration')}
+            except (OSError, ValueError, KeyError) as e:
+                logging.warning(f"Ignoring unreadable scene index {path}: {str(e)}")
+
+        logging.info(f"Analyzing proxy of {Path(video_path).name}")
+        with spans.span('proxy_analysis', path=video_path) as record:
+            frames = self.decode_proxy(video_path)
+            result = self.analyze(frames)
+            record['frames'] = len(frames)
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, size=stat.st_size, mtime_ns=stat.st_mtime_ns, **result)
+        os.replace(tmp_path, path)
+        return result
+
+    def load_into(self, used_segments: UsedSegments, video_paths: List[str], min_shot: float = 2.0,
+                  max_workers: int = 4):
+        """
+        Mark every source's unusable ranges and shot boundaries as used, so
+        sampled segments stay inside a single clean shot. Boundaries are
+        skipped for sources that have no shot of at least `min_shot`.
+        """
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(self.get, path): path for path in video_paths}
+            for future in as_completed(futures):
+                video_path = futures[future]
+                try:
+                    index = future.result()
+                except (OSError, ValueError, subprocess.CalledProcessError) as e:
+                    logging.warning(f"Scene analysis failed for {video_path}: {str(e)}")
+                    continue
+
+                unusable, boundaries = index['unusable'], index['boundaries']
+                shots = np.diff(np.concatenate([[0.0], boundaries, [float(index['duration'])]]))
+                if not (shots >= min_shot).any():
+                    boundaries = boundaries[:0]
+                used_segments.add_ranges(
+                    video_path,
+                    np.concatenate([unusable[:, 0], boundaries]),
+                    np.concatenate([unusable[:, 1], boundaries]),
+                )
+                logging.info(f"{Path(video_path).name}: {len(index['boundaries'])} shot boundaries, "
+                             f"{float((unusable[:, 1] - unusable[:, 0]).sum()):.1f}s blank or static")
+
+class CachedInfoReader(FFMPEG_VideoReader):
+    """
+    moviepy frame reader built from probe-cache metadata.
+
+    Skips moviepy's own `ffmpeg -i` parse; the decoder process only starts
+    on the first get_frame() and restarts there after close().
+    """
+
+    def __init__(self, filename: str, info: dict):
+        self.filename = filename
+        self.proc = None
+        self.fps = info['fps']
+        self.size = [info['width'], info['height']]
+        self.rotation = 0
+        self.resize_algo = 'bicubic'
+        self.duration = info['duration']
+        self.ffmpeg_duration = info['duration']
+        self.nframes = int(info['duration'] * info['fps'])
+        self.infos = info
+        self.pix_fmt = 'rgb24'
+        self.depth = 3
+        self.bufsize = self.depth * self.size[0] * self.size[1] + 100
+        self.pos = 1
+        self.restarts = 0
+
+    def initialize(self, starttime=0):
+        self.restarts += 1
+        super().initialize(starttime)
+
+    def get_frame(self, t):
+        """
+        Like FFMPEG_VideoReader.get_frame, but keyframe-aware on forward jumps.
 
-    def get_available_duration(self, video_path: str, clip_duration: float) -> float:
-        """Calculate total available duration excluding used segments."""
-        used_ranges = sorted(self.segments[video_path], key=lambda x: x.start)
-        total_used = sum(r.end - r.start for r in used_ranges)
-        return clip_duration - total_used
+        moviepy restarts ffmpeg for any jump of more than 100 frames, yet a
+        restart seeks to t - 1s and decodes from the keyframe before that;
+        when that keyframe is not past the current position, reading on is
+        cheaper than spawning a new decoder.
+        """
+        pos = int(self.fps * t + 0.00001) + 1
+        if self.proc and pos > self.pos + 100:
+            keyframes = self.infos['keyframes']
+            i = bisect_right(keyframes, max(t - 1, 0)) - 1
+            if keyframes[max(i, 0)] <= self.pos / self.fps:
+                self.skip_frames(pos - self.pos - 1)
+                self.lastread = self.read_frame()
+                self.pos = pos
+                return self.lastread
+        return super().get_frame(t)
+
+class BufferedFrameReader(CachedInfoReader):
+    """
+    CachedInfoReader that decodes into two preallocated frame buffers.
+
+    Frames are read from the pipe with readinto() instead of read() and
+    np.frombuffer, so steady-state decoding allocates nothing per frame.
+    The returned array is only valid until the next get_frame() call.
+    """
+
+    def __init__(self, filename: str, info: dict):
+        super().__init__(filename, info)
+        width, height = self.size
+        self.buffers = [np.empty((height, width, self.depth), dtype=np.uint8) for _ in range(2)]
+        self.current = 0
+
+    def skip_frames(self, n=1):
+        spare = memoryview(self.buffers[1 - self.current]).cast('B')
+        for _ in range(n):
+            self.proc.stdout.readinto(spare)
+        self.pos += n
+
+    def read_frame(self):
+        buffer = self.buffers[1 - self.current]
+        if self.proc.stdout.readinto(memoryview(buffer).cast('B')) != buffer.nbytes:
+            if not hasattr(self, 'lastread'):
+                raise IOError(f"Failed to read the first frame of {self.filename}")
+            logging.warning(f"Short read in {self.filename} at frame {self.pos}, repeating the last frame")
+            return self.lastread
+        self.current = 1 - self.current
+        self.lastread = buffer
+        return buffer
+
+class FrameWriter:
+    """
+    Pipe raw RGB frames to an ffmpeg encoder from one preallocated buffer.
+
+    Callers composite straight into `frame` and call write(); the buffer
+    goes to ffmpeg's stdin through a memoryview, so no per-frame bytes copy
+    is made (moviepy's writer calls tobytes() on every frame). `audio` is
+    an encoded track muxed with stream copy, or raw PCM described by
+    `audio_format` = (sample format, rate, channels) and encoded to AAC.
+    """
+
+    def __init__(self, output: str, size: Tuple[int, int], fps: float, audio: str = None,
+                 codec: str = 'libx264', preset: str = 'ultrafast', crf: int = 30, threads: int = 0,
+                 audio_format: Tuple[str, int, int] = None):
+        width, height = size
+        self.output = output
+        self.frame = np.zeros((height, width, 3), dtype=np.uint8)
+        self.frames = 0
+        args = [FFMPEG_BINARY, '-hide_banner', '-loglevel', 'error', '-y',
+                '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', f"{width}x{height}", '-r', str(fps), '-i', '-']
+        if audio and audio_format:
+            sample_fmt, rate, channels = audio_format
+            args += ['-f', sample_fmt, '-ar', str(rate), '-ac', str(channels), '-i', audio,
+                     '-map', '0:v:0', '-map', '1:a:0', '-c:a', 'aac', '-shortest']
+        elif audio:
+            args += ['-i', audio, '-map', '0:v:0', '-map', '1:a:0', '-c:a', 'copy', '-shortest']
+        args += ['-c:v', codec, '-preset', preset, '-crf', str(crf), '-pix_fmt', 'yuv420p',
+                 '-threads', str(threads), output]
+        self.args = args
+        self.proc = None
+
+    def __enter__(self):
+        self.proc = subprocess.Popen(self.args, stdin=subprocess.PIPE, bufsize=0)
+        return self
+
+    def write(self):
+        view = memoryview(self.frame).cast('B')
+        while view:
+            view = view[self.proc.stdin.write(view):]
+        self.frames += 1
+
+    def __exit__(self, exc_type, exc, tb):
+        self.proc.stdin.close()
+        if exc_type is not None:
+            self.proc.kill()
+        if self.proc.wait() and exc_type is None:
+            raise subprocess.CalledProcessError(self.proc.returncode, self.args)
+
+class ReaderPool:
+    """
+    Bounded LRU pool of open video decoders.
+
+    Every source gets a lightweight clip whose frames are read through the
+    pool; at most `max_open` ffmpeg processes (and their frame buffers) are
+    alive at once, the least recently used one is closed when another
+    source needs decoding and reopened lazily at the requested time.
+    """
+
+    def __init__(self, max_open: int = 4, probe_cache: ProbeCache = None):
+        self.max_open = max(1, max_open)
+        self.probe_cache = probe_cache or get_probe_cache()
+        self.readers: Dict[str, CachedInfoReader] = {}
+        self.open_readers: OrderedDict = OrderedDict()
+        self.reopens = 0
+
+    def clip(self, video_path: str, start: float = 0.0, end: float = None, speed: float = 1.0) -> VideoClip:
+        """
+        Clip over [start, end) of `video_path` played at `speed`, sized from
+        cached metadata. Nothing is decoded here: moviepy's subclip()/speedx()
+        would each read a frame to recompute the size.
+        """
+        info = self.probe_cache.probe(video_path)
+        if not info['fps'] or not info['width'] or not info['height']:
+            raise ValueError(f"Incomplete stream metadata for {video_path}")
+        if video_path not in self.readers:
+            self.readers[video_path] = CachedInfoReader(video_path, info)
+
+        end = info['duration'] if end is None else end
+        clip = VideoClip(duration=(end - start) / speed)
+        clip.make_frame = lambda t: self.get_frame(video_path, start + speed * t)
+        clip.size = (info['width'], info['height'])
+        clip.fps = info['fps']
+        clip.filename = video_path
+        return clip
+
+    def get_frame(self, video_path: str, t: float) -> np.ndarray:
+        reader = self.readers[video_path]
+        if video_path in self.open_readers:
+            self.open_readers.move_to_end(video_path)
+        else:
+            if reader.pos > 1:
+                self.reopens += 1
+            self.open_readers[video_path] = reader
+            while len(self.open_readers) > self.max_open:
+                _, evicted = self.open_readers.popitem(last=False)
+                evicted.close()
+        return reader.get_frame(t)
+
+    def restarts(self) -> int:
+        """Decoder processes started so far (first opens, seeks and reopens after eviction)."""
+        return sum(reader.restarts for reader in self.readers.values())
+
+    def close(self):
+        for reader in self.open_readers.values():
+            reader.close()
+        self.open_readers.clear()
+        self.readers.clear()
 
 class VideoProcessor:
-    def __init__(self, target_duration: Tuple[int, int] = (60, 120)):
+    def __init__(self, target_duration: Tuple[int, int] = (60, 120), engine: str = "moviepy",
+                 segment_store: UsedSegmentStore = None, max_open_readers: int = 4,
+                 scene_index: SceneIndex = None, segment_cache: 'SegmentCache' = None, chunks: int = 1):
         self.min_duration = target_duration[0]
         self.max_duration = target_duration[1]
-        self.loaded_clips = {}
+        self.engine = engine
+        self.segment_store = segment_store
+        self.scene_index = scene_index
+        self.segment_cache = segment_cache
+        self.chunks = chunks
         self.used_segments = UsedSegments()
+        self.used_cuts: List[Tuple[str, float, float, float]] = []
         self.ffmpeg_path = self._check_ffmpeg()
+        self.ffprobe_path = self.ffmpeg_path.replace('ffmpeg', 'ffprobe')
+        self.probe_cache = get_probe_cache()
+        self.probe_cache.ffprobe_path = self.ffprobe_path
+        self.reader_pool = ReaderPool(max_open_readers, self.probe_cache)
         change_settings({"FFMPEG_BINARY": self.ffmpeg_path})
 
     def _check_ffmpeg(self):
@@ -102,161 +918,348 @@ class VideoProcessor:
                 logging.error(f"FFmpeg check failed: {str(e)}")
                 raise RuntimeError("FFmpeg not found or not working properly")
 
-    def load_video(self, video_path: str) -> VideoFileClip:
-        video_path = str(Path(video_path).resolve())
-        if video_path not in self.loaded_clips:
-            try:
-                logging.info(f"Loading video: {video_path}")
-                clip = VideoFileClip(video_path, verbose=True)
-                if not clip.reader:
-                    raise ValueError("Video reader not initialized")
-                self.loaded_clips[video_path] = clip
-                logging.info(f"Successfully loaded video: {video_path} (duration: {clip.duration:.2f}s)")
-            except Exception as e:
-                logging.error(f"Failed to load video {video_path}: {str(e)}")
-                raise
-        return self.loaded_clips[video_path]
+    def get_stream_info(self, video_path: str) -> dict:
+        """Cached duration, codec, resolution, fps and keyframes of a source."""
+        return self.probe_cache.probe(video_path)
+
+    def get_keyframes(self, video_path: str) -> List[float]:
+        """Keyframe timestamps of the first video stream (from packet flags, no decoding)."""
+        return self.get_stream_info(video_path)['keyframes']
+
+    def get_duration(self, video_path: str) -> float:
+        return self.get_stream_info(video_path)['duration']
+
+    def snap_to_keyframes(self, video_path: str, start: float, end: float) -> Tuple[float, float]:
+        """Widen a range so it starts and ends on keyframes (whole GOPs for stream copy)."""
+        keyframes = self.get_keyframes(video_path)
+        duration = self.get_duration(video_path)
+        i = bisect_right(keyframes, start) - 1
+        snapped_start = keyframes[max(i, 0)]
+        j = bisect_left(keyframes, end)
+        snapped_end = keyframes[j] if j < len(keyframes) else duration
+        return snapped_start, snapped_end
 
     def find_available_segment(self, video_path: str, desired_duration: float) -> Tuple[float, float]:
         """Find an available time segment in the video that hasn't been used."""
-        clip = self.load_video(video_path)
-        max_attempts = 50  # Prevent infinite loops
-        attempts = 0
+        duration = self.get_duration(video_path)
+        desired_duration = min(desired_duration, duration)
 
-        while attempts < max_attempts:
-            start_time = random.uniform(0, max(0, clip.duration - desired_duration))
-            end_time = start_time + desired_duration
+        if self.engine != "copy":
+            start_time = self.used_segments.sample_start(video_path, duration, desired_duration)
+            return start_time, start_time + desired_duration
 
+        # Keyframe snapping can widen a sampled range into a used one, so retry a few times
+        max_attempts = 50  # Prevent infinite loops
+        for _ in range(max_attempts):
+            start_time = self.used_segments.sample_start(video_path, duration, desired_duration)
+            start_time, end_time = self.snap_to_keyframes(video_path, start_time, start_time + desired_duration)
             if self.used_segments.is_available(video_path, start_time, end_time):
                 return start_time, end_time
 
-            attempts += 1
-
-        raise ValueError("Could not find an available segment after maximum attempts")
-
-    def get_random_segment(self, video_path: str) -> VideoFileClip:
-        """Extract a random segment with repetition prevention."""
-        logging.info(f"Creating random segment from: {video_path}")
-        clip = self.load_video(video_path)
+        raise ValueError("Could not find an available keyframe-aligned segment after maximum attempts")
 
-        # Calculate available duration
-        available_duration = self.used_segments.get_available_duration(video_path, clip.duration)
-        if available_duration < 1:  # Minimum segment length
+    def pick_segment_duration(self, video_path: str, clip_duration: float) -> float:
+        """Random segment length between 1s and 5s that still fits in the largest free gap."""
+        longest_gap = self.used_segments.longest_free_gap(video_path, clip_duration)
+        if longest_gap < 1:  # Minimum segment length
             raise ValueError("Not enough unused duration remaining")
 
-        # Determine segment duration
-        max_segment_duration = min(5, available_duration)
+        max_segment_duration = min(5, longest_gap)
         min_segment_duration = min(1, max_segment_duration)
-        segment_duration = random.uniform(min_segment_duration, max_segment_duration)
+        return random.uniform(min_segment_duration, max_segment_duration)
+
+    def get_random_segment(self, video_path: str) -> Tuple[str, float, float, float]:
+        """Pick a random unused range with a speed variation (planning only, nothing is decoded)."""
+        logging.info(f"Picking random segment from: {video_path}")
+
+        # Determine segment duration from cached metadata
+        duration = self.get_duration(video_path)
+        segment_duration = self.pick_segment_duration(video_path, duration)
 
         try:
             # Find an unused time range
             start_time, end_time = self.find_available_segment(video_path, segment_duration)
+            end_time = min(end_time, duration)
             logging.info(f"Found unused segment: {start_time:.2f}s to {end_time:.2f}s")
 
-            # Extract the segment
-            segment = clip.subclip(start_time, end_time)
-
-            # Apply speed variation
             speed_factor = random.uniform(1, 2.5)
             logging.info(f"Applying speed factor: {speed_factor:.2f}x")
-            segment = segment.speedx(speed_factor)
 
             # Record the used segment
             self.used_segments.add_segment(video_path, start_time, end_time)
+            self.used_cuts.append((video_path, start_time, end_time, speed_factor))
 
-            return segment
+            return video_path, start_time, end_time, speed_factor
 
         except Exception as e:
             logging.error(f"Failed to create segment: {str(e)}")
             raise
 
-    def create_video(self, input_paths: List[str], output_dir: str) -> str:
+    def get_random_cut(self, video_path: str) -> Tuple[str, float, float]:
+        """Pick a keyframe-aligned unused range for the stream-copy engine (no decoding)."""
+        logging.info(f"Picking random cut from: {video_path}")
+        segment_duration = self.pick_segment_duration(video_path, self.get_duration(video_path))
+
+        start_time, end_time = self.find_available_segment(video_path, segment_duration)
+        logging.info(f"Found unused keyframe-aligned segment: {start_time:.2f}s to {end_time:.2f}s")
+        self.used_segments.add_segment(video_path, start_time, end_time)
+        self.used_cuts.append((video_path, start_time, end_time, 1.0))
+        return video_path, start_time, end_time
+
+    def sources_compatible(self, video_paths: List[str]) -> bool:
+        """True when all sources share codec, resolution, pixel format, frame rate and time base (safe for concat -c copy)."""
+        signatures = {
+            (info['codec'], info['width'], info['height'], info['pix_fmt'], round(info['fps'], 3), info.get('time_base'))
+            for info in (self.get_stream_info(path) for path in video_paths)
+        }
+        return len(signatures) == 1
+
+    def render_stream_copy(self, cuts: List[Tuple[str, float, float]], output_path: str):
+        """Cut each range with stream copy and join the pieces with the concat demuxer.
+
+        Every range runs from keyframe to keyframe, so each piece is cut as
+        the exact number of packets up to the next keyframe: a duration cut
+        would also keep reordered B-frames past the end and break the
+        timestamps of the join. Falls back to a single re-encode through the
+        concat filter when the sources differ in codec, resolution or rate.
+        """
+        if not self.sources_compatible([path for path, _, _ in cuts]):
+            logging.info("Sources differ in codec/resolution/frame rate, re-encoding with concat filter")
+            self._render_reencode(cuts, output_path)
+            return
+
+        with tempfile.TemporaryDirectory(prefix='remix_', dir=str(Path(output_path).parent)) as tmp_dir:
+            pieces = []
+            for i, (path, start, end) in enumerate(cuts):
+                piece = os.path.join(tmp_dir, f"seg_{i:04d}{Path(path).suffix}")
+                frames = max(1, round((end - start) * self.get_stream_info(path)['fps']))
+                subprocess.run(
+                    [self.ffmpeg_path, '-hide_banner', '-loglevel', 'error', '-y',
+                     '-ss', f"{start:.6f}", '-i', path, '-frames:v', str(frames),
+                     '-map', '0:v:0', '-c', 'copy', '-an', piece],
+                    check=True
+                )
+                pieces.append(piece)
+
+            logging.info(f"Joining {len(pieces)} stream-copied segments")
+            self.concat_copy(pieces, output_path, tmp_dir)
+
+    def concat_copy(self, pieces: List[str], output_path: str, tmp_dir: str):
+        """Join same-profile pieces in list order with the concat demuxer (no re-encode)."""
+        list_file = write_concat_list(pieces, os.path.join(tmp_dir, 'concat.txt'))
+
+        subprocess.run(
+            [self.ffmpeg_path, '-hide_banner', '-loglevel', 'error', '-y',
+             '-f', 'concat', '-safe', '0', '-i', list_file,
+             '-c', 'copy', '-movflags', '+faststart', output_path],
+            check=True
+        )
+
+    def render_scheduled(self, segments: List[VideoClip], cuts: List[Tuple[str, float, float, float]],
+                         output_path: str, fps: int = 24):
+        """Encode segments source by source in ascending start time, then join them in output order.
+
+        moviepy restarts a source's ffmpeg decoder on every backward seek, so
+        rendering the random output order directly costs one restart per
+        segment. Visiting each source front to back keeps its decoder moving
+        forward; the staged pieces share one encoding profile (padded to the
+        largest segment size, like compose concatenation) so the final join
+        is a stream copy. With a segment cache, pieces rendered by earlier
+        runs are reused and new ones are kept for later runs.
+        """
+        width = max(segment.w for segment in segments)
+        height = max(segment.h for segment in segments)
+        order = sorted(range(len(segments)), key=lambda i: (cuts[i][0], cuts[i][1]))
+
+        hits = self.segment_cache.hits if self.segment_cache else 0
+        with tempfile.TemporaryDirectory(prefix='remix_', dir=str(Path(output_path).parent)) as tmp_dir:
+            pieces = [None] * len(segments)
+            for i in order:
+                key = None
+                if self.segment_cache:
+                    path, start, end, speed = cuts[i]
+                    key = self.segment_cache.key(path, {
+                        'in': start, 'out': end, 'speed': speed, 'size': [width, height], 'fps': fps,
+                        'profile': 'remix-moviepy-libx264-ultrafast',
+                    })
+                    pieces[i] = self.segment_cache.get(key)
+                    if pieces[i]:
+                        continue
+
+                segment = segments[i]
+                if (segment.w, segment.h) != (width, height):
+                    segment = segment.on_color(size=(width, height), color=(0, 0, 0), pos='center')
+                pieces[i] = self.segment_cache.tmp_path(key) if key else os.path.join(tmp_dir, f"seg_{i:04d}.mp4")
+                try:
+                    segment.write_videofile(
+                        pieces[i],
+                        fps=fps,
+                        codec='libx264',
+                        audio=False,
+                        preset='ultrafast',
+                        threads=4,
+                        logger=None,
+                        ffmpeg_params=['-hide_banner', '-loglevel', 'error']
+                    )
+                    if key:
+                        pieces[i] = self.segment_cache.put(key, pieces[i])
+                finally:
+                    if key and pieces[i].endswith('.tmp.mp4') and os.path.exists(pieces[i]):
+                        os.remove(pieces[i])
+
+            if self.segment_cache:
+                logging.info(f"{self.segment_cache.hits - hits} of {len(pieces)} segments came from the segment cache")
+            logging.info(f"Joining {len(pieces)} staged segments in output order")
+            self.concat_copy(pieces, output_path, tmp_dir)
+
+    def _render_reencode(self, cuts: List[Tuple[str, float, float]], output_path: str):
+        """Trim, scale to the first source's size and concatenate in one ffmpeg pass."""
+        first = self.get_stream_info(cuts[0][0])
+        width, height = first['width'], first['height']
+        args = [self.ffmpeg_path, '-hide_banner', '-loglevel', 'error', '-y']
+        filters = []
+        for i, (path, start, end) in enumerate(cuts):
+            args += ['-ss', f"{start:.6f}", '-t', f"{end - start:.6f}", '-i', path]
+            filters.append(
+                f"[{i}:v:0]scale={width}:{height}:force_original_aspect_ratio=decrease,"
+                f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1,fps=24[v{i}]"
+            )
+        labels = ''.join(f"[v{i}]" for i in range(len(cuts)))
+        filters.append(f"{labels}concat=n={len(cuts)}:v=1:a=0[out]")
+        args += ['-filter_complex', ';'.join(filters), '-map', '[out]',
+                 '-c:v', 'libx264', '-preset', 'ultrafast', '-threads', '4', output_path]
+        subprocess.run(args, check=True)
+
+    def remember_cuts(self, output_path: str):
+        """Record this run's cuts in the cut history and the cross-run used-segment store."""
+        record_cuts(self.used_cuts, output_path, 'remix')
+        if self.segment_store:
+            per_source = defaultdict(list)
+            for video_path, start, end, _ in self.used_cuts:
+                per_source[video_path].append((start, end))
+            for video_path, ranges in per_source.items():
+                try:
+                    self.segment_store.save(video_path, ranges)
+                except OSError as e:
+                    logging.warning(f"Could not save used-segment history of {video_path}: {str(e)}")
+
+    def plan_video(self, input_paths: List[str], output_dir: str) -> dict:
+        """Pick this remix's segments and return them as an edit decision list (nothing is decoded)."""
         if not input_paths:
             raise ValueError("No input videos provided")
 
         # Generate automatic filename with UUID
         unique_id = str(uuid.uuid4())[:8]  # Use first 8 characters of UUID
         output_filename = f"remix_{unique_id}_.mp4"
-
-        # Ensure output directory exists
-        output_dir_path = Path(output_dir)
-        output_dir_path.mkdir(parents=True, exist_ok=True)
-
-        # Full output path
-        output_path = output_dir_path / output_filename
-
-        logging.info(f"Starting video creation with {len(input_paths)} input files")
+        output_path = Path(output_dir).resolve() / output_filename
+
+        logging.info(f"Planning video with {len(input_paths)} input files")
+        infos = self.probe_cache.probe_many(input_paths)
+        if self.segment_store:
+            self.segment_store.load_into(self.used_segments, input_paths)
+        if self.scene_index:
+            self.scene_index.load_into(self.used_segments, input_paths)
         logging.info(f"Generated output filename: {output_filename}")
-        segments = []
         current_duration = 0
         target_duration = random.uniform(self.min_duration, self.max_duration)
 
-        try:
-            available_videos = input_paths.copy()
-            max_attempts = 100  # Prevent infinite loops
-            attempts = 0
-
-            while current_duration < target_duration and attempts < max_attempts:
-                if not available_videos:
-                    logging.warning("No more available videos with unused segments")
-                    break
-
-                video_path = random.choice(available_videos)
-
-                try:
-                    segment = self.get_random_segment(video_path)
-                    segments.append(segment)
-                    current_duration += segment.duration
-                    logging.info(f"Added segment (duration: {segment.duration:.2f}s, total: {current_duration:.2f}s)")
-
-                except ValueError as e:
-                    logging.warning(f"No more unused segments in {video_path}: {str(e)}")
-                    available_videos.remove(video_path)
-                except Exception as e:
-                    logging.warning(f"Error processing {video_path}: {str(e)}")
-                    available_videos.remove(video_path)
+        available_videos = [path for path in input_paths if path in infos]
+        max_attempts = 100  # Prevent infinite loops
+        attempts = 0
 
-                attempts += 1
+        while current_duration < target_duration and attempts < max_attempts:
+            if not available_videos:
+                logging.warning("No more available videos with unused segments")
+                break
 
-            if not segments:
-                raise Exception("Failed to create any valid segments")
+            video_path = random.choice(available_videos)
 
-            logging.info("Concatenating segments...")
-            final_video = concatenate_videoclips(segments, method="compose")
+            try:
+                with spans.span('segment_search'):
+                    if self.engine == "copy":
+                        _, start, end = self.get_random_cut(video_path)
+                        segment_duration = end - start
+                    else:
+                        _, start, end, speed = self.get_random_segment(video_path)
+                        segment_duration = (end - start) / speed
+                current_duration += segment_duration
+                logging.info(f"Added segment (duration: {segment_duration:.2f}s, total: {current_duration:.2f}s)")
+
+            except ValueError as e:
+                logging.warning(f"No more unused segments in {video_path}: {str(e)}")
+                available_videos.remove(video_path)
+            except Exception as e:
+                logging.warning(f"Error processing {video_path}: {str(e)}")
+                available_videos.remove(video_path)
 
-            output_path_str = str(output_path.resolve())
-            logging.info(f"Writing final video to: {output_path_str}")
+            attempts += 1
 
-            final_video.write_videofile(
-                output_path_str,
-                fps=24,
-                codec='libx264',
-                audio=False,
-                preset='ultrafast',
-                threads=4,
-                verbose=False,
-                ffmpeg_params=['-hide_banner', '-loglevel', 'error']
-            )
+        if not self.used_cuts:
+            raise Exception("Failed to create any valid segments")
+
+        sources = {path for path, _, _, _ in self.used_cuts}
+        return {
+            'version': PLAN_VERSION,
+            'kind': 'remix',
+            'output': str(output_path),
+            'engine': self.engine,
+            # Stream copy keeps the sources' frame rate
+            'fps': infos[self.used_cuts[0][0]]['fps'] if self.engine == "copy" else 24,
+            'size': [max(infos[path]['width'] for path in sources), max(infos[path]['height'] for path in sources)],
+            'segments': [plan_segment(path, start, end, speed) for path, start, end, speed in self.used_cuts],
+            'rotation': "none",
+            'logo': None,
+            'audio': None,
+            'encode': {'codec': 'libx264', 'preset': 'ultrafast', 'crf': 23},
+            'avoid_reuse': self.segment_store is not None,
+            'reuse_expiry': self.segment_store.expiry_days if self.segment_store else 30.0,
+        }
 
-            return output_path_str
+    def render_plan(self, plan: dict, output_path: str = None) -> str:
+        """Render a remix edit decision list with this processor's engine."""
+        output_path_str = str(Path(output_path or plan['output']).resolve())
+        Path(output_path_str).parent.mkdir(parents=True, exist_ok=True)
+        self.used_cuts = [(seg['source'], seg['in'], seg['out'], seg['speed']) for seg in plan['segments']]
+        logging.info(f"Writing final video to: {output_path_str}")
+        partial = partial_output(output_path_str)
 
+        try:
+            if self.engine == "copy":
+                with spans.span('stream_copy', segments=len(self.used_cuts)) as record:
+                    self.render_stream_copy([(path, start, end) for path, start, end, _ in self.used_cuts], partial)
+                    record['bytes'] = output_size(partial)
+            elif self.chunks > 1 and not self.segment_cache:
+                frames = int(plan_duration(plan) * plan['fps'])
+                with spans.span('chunked_render', frames=frames, segments=len(self.used_cuts)) as record:
+                    record['chunks'] = render_plan_chunked(plan, partial, 0, self.chunks)
+                    record['bytes'] = output_size(partial)
+                logging.info(f"Rendered {len(self.used_cuts)} segments in {record['chunks']} parallel chunks")
+            else:
+                segments = [self.reader_pool.clip(path, start, end, speed) for path, start, end, speed in self.used_cuts]
+                frames = int(sum(segment.duration for segment in segments) * plan['fps'])
+                with spans.span('encode', frames=frames, segments=len(segments)) as record:
+                    self.render_scheduled(segments, self.used_cuts, partial, fps=plan['fps'])
+                    record['bytes'] = output_size(partial)
+                    record['decoder_restarts'] = self.reader_pool.restarts()
+                logging.info(f"Rendered {len(segments)} segments from {len(self.reader_pool.readers)} sources "
+                             f"with {record['decoder_restarts']} decoder restarts")
+            os.replace(partial, output_path_str)
         except Exception as e:
             logging.error(f"Error in video creation: {str(e)}")
             raise
         finally:
             logging.info("Cleaning up resources...")
-            for clip in segments:
-                try:
-                    clip.close()
-                except Exception as e:
-                    logging.warning(f"Error closing segment: {str(e)}")
+            if os.path.exists(partial):
+                os.remove(partial)
+            if self.reader_pool.reopens:
+                logging.info(f"Decoder pool reopened {self.reader_pool.reopens} evicted reader(s)")
+            self.reader_pool.close()
 
-            for clip in self.loaded_clips.values():
-                try:
-                    clip.close()
-                except Exception as e:
-                    logging.warning(f"Error closing clip: {str(e)}")
+        self.remember_cuts(output_path_str)
+        return output_path_str
+
+    def create_video(self, input_paths: List[str], output_dir: str) -> str:
+        return self.render_plan(self.plan_video(input_paths, output_dir))
 
 def setup_logging():
     """Set up logging configuration with colored output and detailed formatting."""
@@ -305,45 +1308,507 @@ def setup_logging():
 
     return logging.getLogger(__name__)
 
-def set_imagemagick_path():
-    """Set the ImageMagick path based on the operating system."""
-    if os.name == 'nt':
-        imagemagick_path = r"C:\Program Files\ImageMagick-7.1.1-Q16-HDRI\magick.exe"
-    else:
-        imagemagick_path = "/usr/local/bin/convert"
-
-    if os.path.exists(imagemagick_path):
-        change_settings({"IMAGEMAGICK_BINARY": imagemagick_path})
-        logging.info(f"ImageMagick path set to: {imagemagick_path}")
-    else:
-        logging.warning(f"ImageMagick not found at {imagemagick_path}. Please install it or update the path.")
+# Logo overlay assets
+class LogoCache:
+    """
+    Pre-rendered logo images keyed by (text, font, size, color, opacity).
+
+    Each logo is rasterized once with Pillow (no ImageMagick) into a
+    premultiplied RGBA array, kept in an in-memory LRU and saved as a PNG
+    under ./cache/logos so later runs and worker processes skip rendering.
+    """
+
+    def __init__(self, cache_dir: str = './cache/logos', max_memory: int = 16, max_disk: int = 256):
+        self.cache_dir = cache_dir
+        self.max_memory = max_memory
+        self.max_disk = max_disk
+        self.assets: 'OrderedDict[str, np.ndarray]' = OrderedDict()
+
+    @staticmethod
+    def key(text: str, font: str, fontsize: int, color: str, opacity: float, quarter_turns: int = 0) -> str:
+        font_stat = os.stat(font)
+        ident = (f"{text}|{Path(font).resolve()}|{font_stat.st_size}|{font_stat.st_mtime_ns}"
+                 f"|{fontsize}|{color}|{opacity}|{quarter_turns % 4}")
+        return hashlib.sha1(ident.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def render(text: str, font: str, fontsize: int, color: str, opacity: float, quarter_turns: int = 0) -> np.ndarray:
+        """
+        Rasterize text to a premultiplied RGBA uint8 array with opacity baked
+        into alpha, optionally turned counterclockwise by quarter_turns * 90°.
+        """
+        font_obj = ImageFont.truetype(font, fontsize)
+        left, top, right, bottom = font_obj.getbbox(text)
+        pad = 2
+        glyphs = Image.new('L', (right - left + 2 * pad, bottom - top + 2 * pad), 0)
+        ImageDraw.Draw(glyphs).text((pad - left, pad - top), text, font=font_obj, fill=255)
+
+        alpha = np.asarray(glyphs, dtype=np.float32) / 255.0 * opacity
+        rgb = np.array(ImageColor.getrgb(color)[:3], dtype=np.float32)
+        rgba = np.empty(alpha.shape + (4,), dtype=np.float32)
+        rgba[..., :3] = rgb * alpha[..., None]
+        rgba[..., 3] = alpha * 255.0
+        return np.ascontiguousarray(np.rot90(np.round(rgba).astype(np.uint8), quarter_turns % 4))
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.png")
+
+    def get(self, text: str, font: str, fontsize: int = 30, color: str = 'white', opacity: float = 0.7,
+            quarter_turns: int = 0) -> Tuple[np.ndarray, str]:
+        """Return (premultiplied RGBA array, PNG path) for a logo, rendering it on first use."""
+        key = self.key(text, font, fontsize, color, opacity, quarter_turns)
+        path = self.path_for(key)
+        if key in self.assets:
+            self.assets.move_to_end(key)
+            return self.assets[key], path
+
+        if os.path.exists(path):
+            rgba = np.asarray(Image.open(path).convert('RGBA'))
+            os.utime(path)  # Mark as recently used for disk eviction
+        else:
+            logging.info(f"Rendering logo '{text}' ({fontsize}px, {color}, opacity {opacity})")
+            rgba = self.render(text, font, fontsize, color, opacity, quarter_turns)
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            Image.fromarray(rgba, 'RGBA').save(tmp_path, format='PNG')
+            os.replace(tmp_path, path)
+            self._evict_disk()
+
+        self.assets[key] = rgba
+        while len(self.assets) > self.max_memory:
+            self.assets.popitem(last=False)
+        return rgba, path
+
+    def _evict_disk(self):
+        """Drop the least recently used PNGs beyond max_disk."""
+        pngs = sorted(Path(self.cache_dir).glob('*.png'), key=lambda f: f.stat().st_mtime)
+        for stale in pngs[:max(0, len(pngs) - self.max_disk)]:
+            try:
+                stale.unlink()
+            except OSError:
+                pass
+
+class LogoOverlay:
+    """
+    In-place watermark stage for frames of a fixed size.
+
+    The premultiplied color (scaled for integer blending) and inverse alpha
+    are precomputed as uint16 planes cropped to the logo's visible pixels
+    and to the frame, so blend() touches only that box with dtype-matched
+    NumPy ops and frames outside [start, end) are skipped entirely.
+    """
+
+    def __init__(self, rgba: np.ndarray, position, frame_size, start: float = 0.0, end: float = None):
+        self.start = start
+        self.end = end
+        x, y = position
+        width, height = frame_size
+        visible = np.argwhere(rgba[..., 3] > 0)
+        if not len(visible):
+            self.box = None
+            return
+        (top, left), (bottom, right) = visible.min(axis=0).tolist(), (visible.max(axis=0) + 1).tolist()
+        x0, y0 = max(x + left, 0), max(y + top, 0)
+        x1, y1 = min(x + right, width), min(y + bottom, height)
+        if x0 >= x1 or y0 >= y1:
+            self.box = None
+            return
+        self.box = (slice(y0, y1), slice(x0, x1))
+        crop = rgba[y0 - y:y1 - y, x0 - x:x1 - x].astype(np.uint16)
+        # out = (frame * (255 - a) + color * 255 + 127) // 255, all within uint16
+        self.keep = np.repeat(255 - crop[..., 3:], 3, axis=2)
+        self.bias = crop[..., :3] * 255 + 127
+        self.scratch = np.empty(self.keep.shape, dtype=np.uint16)
+
+    def active(self, t: float) -> bool:
+        return self.box is not None and t >= self.start and (self.end is None or t < self.end)
+
+    def blend(self, frame: np.ndarray, t: float):
+        if not self.active(t):
+            return
+        region = frame[self.box]
+        scratch = self.scratch
+        np.copyto(scratch, region)
+        np.multiply(scratch, self.keep, out=scratch)
+        np.add(scratch, self.bias, out=scratch)
+        np.floor_divide(scratch, 255, out=scratch)
+        np.copyto(region, scratch, casting='unsafe')
+
+_logo_cache = None
+
+def get_logo_cache() -> LogoCache:
+    """Process-wide logo cache shared by generate jobs."""
+    global _logo_cache
+    if _logo_cache is None:
+        _logo_cache = LogoCache()
+    return _logo_cache
+
+# Soundtrack cache
+class SoundtrackCache:
+    """
+    Decoded music as memory-mapped float32 PCM, keyed by (track, sample rate).
+
+    Only the prefix a render needs is decoded (rounded up to whole
+    `chunk_seconds`), saved as ./cache/audio/<key>.npy and reused by later
+    repeats, jobs and runs; a longer request re-decodes a longer prefix.
+    When ffmpeg returns less than asked the whole track is cached and the
+    file is named <key>.full.npy. Least recently used files beyond
+    `max_bytes` are evicted.
+    """
+
+    CHANNELS = 2
+
+    def __init__(self, cache_dir: str = './cache/audio', max_bytes: int = 2 << 30, chunk_seconds: float = 30.0):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.chunk_seconds = chunk_seconds
+        self.tracks: Dict[str, np.ndarray] = {}
+
+    @staticmethod
+    def key(track: str, rate: int) -> str:
+        stat = os.stat(track)
+        ident = f"{Path(track).resolve()}|{stat.st_size}|{stat.st_mtime_ns}|{rate}"
+        return hashlib.sha1(ident.encode('utf-8')).hexdigest()
+
+    def _decode(self, track: str, rate: int, seconds: float) -> np.ndarray:
+        result = subprocess.run(
+            [FFMPEG_BINARY, '-hide_banner', '-loglevel', 'error', '-t', f"{seconds:.3f}", '-i', track,
+             '-vn', '-f', 'f32le', '-ac', str(self.CHANNELS), '-ar', str(rate), '-'],
+            stdout=subprocess.PIPE, check=True
+        )
+        return np.frombuffer(result.stdout, dtype=np.float32).reshape(-1, self.CHANNELS)
+
+    def get(self, track: str, seconds: float, rate: int = 44100) -> np.ndarray:
+        """PCM frames covering at least `seconds` (fewer if the track is shorter), memory-mapped."""
+        key = self.key(track, rate)
+        needed = int(np.ceil(seconds * rate))
+        pcm = self.tracks.get(key)
+        if pcm is None:
+            for name in (f"{key}.full.npy", f"{key}.npy"):
+                path = os.path.join(self.cache_dir, name)
+                if os.path.exists(path):
+                    pcm = np.load(path, mmap_mode='r')
+                    os.utime(path)
+                    break
+        complete = pcm is not None and getattr(pcm, 'filename', '').endswith('.full.npy')
+        if pcm is not None and (complete or len(pcm) >= needed):
+            self.tracks[key] = pcm
+            return pcm
+
+        decode_seconds = np.ceil(seconds / self.chunk_seconds) * self.chunk_seconds
+        logging.info(f"Decoding {decode_seconds:.0f}s of {track} at {rate} Hz")
+        decoded = self._decode(track, rate, decode_seconds)
+        complete = len(decoded) < int(decode_seconds * rate) - rate // 10
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = os.path.join(self.cache_dir, f"{key}.full.npy" if complete else f"{key}.npy")
+        tmp_path = f"{path}.{os.getpid()}.tmp.npy"
+        np.save(tmp_path, decoded)
+        os.replace(tmp_path, path)
+        if complete and os.path.exists(os.path.join(self.cache_dir, f"{key}.npy")):
+            os.remove(os.path.join(self.cache_dir, f"{key}.npy"))
+        self._evict_disk(keep=path)
+        self.tracks[key] = np.load(path, mmap_mode='r')
+        return self.tracks[key]
+
+    def _evict_disk(self, keep: str = None):
+        """Drop the least recently used tracks beyond max_bytes (never `keep` or in-progress files)."""
+        files = []
+        for cached in Path(self.cache_dir).glob('*.npy'):
+            if cached.name.endswith('.tmp.npy'):
+                continue
+            try:
+                stat = cached.stat()
+            except FileNotFoundError:
+                continue  # Evicted by another process meanwhile
+            files.append((stat.st_mtime, stat.st_size, cached))
+        files.sort(key=lambda entry: entry[0], reverse=True)
+        total = 0
+        for _, size, cached in files:
+            total += size
+            if total > self.max_bytes and str(cached) != keep:
+                try:
+                    cached.unlink()
+                except OSError:
+                    pass
+
+_soundtrack_cache = None
+
+def get_soundtrack_cache() -> SoundtrackCache:
+    """Process-wide soundtrack cache shared by generate jobs."""
+    global _soundtrack_cache
+    if _soundtrack_cache is None:
+        _soundtrack_cache = SoundtrackCache()
+    return _soundtrack_cache
+
+def write_soundtrack(track: str, duration: float, output: str, fade_in: float = 2.0, fade_out: float = 1.0,
+                     rate: int = 44100):
+    """
+    Write `duration` seconds of `track` as raw f32le stereo PCM with linear
+    fade-in / fade-out gain ramps (silence past the end of a short track).
+    """
+    n = int(round(duration * rate))
+    pcm = get_soundtrack_cache().get(track, duration, rate)
+    out = np.zeros((n, SoundtrackCache.CHANNELS), dtype=np.float32)
+    available = min(n, len(pcm))
+    out[:available] = pcm[:available]
+
+    ramp_in = min(n, int(fade_in * rate))
+    out[:ramp_in] *= (np.arange(ramp_in, dtype=np.float32) / (fade_in * rate))[:, None]
+    ramp_out = min(n, int(fade_out * rate))
+    out[n - ramp_out:] *= (np.arange(ramp_out, 0, -1, dtype=np.float32) / (fade_out * rate))[:, None]
+    out.tofile(output)
+
+# Segment cache
+class SegmentCache:
+    """
+    Encoded intermediate segments, content-addressed.
+
+    A segment's key hashes the source's content fingerprint (so renamed or
+    moved sources still hit) with everything that shapes its pixels: in and
+    out points, speed, fade, rotation, logo window, frame size, fps and
+    encoding profile. Pieces that share a profile are joined with a stream
+    copy, so a rerun or a reordered plan only encodes the segments it has
+    not seen before. Least recently used files beyond `max_bytes` are
+    evicted.
+    """
+
+    def __init__(self, cache_dir: str = './cache/segments', max_bytes: int = 10 << 30):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.fingerprints: Dict[str, str] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, source: str, params: dict) -> str:
+        if source not in self.fingerprints:
+            self.fingerprints[source] = content_fingerprint(source)
+        ident = json.dumps({'source': self.fingerprints[source], **params}, sort_keys=True)
+        return hashlib.sha1(ident.encode('utf-8')).hexdigest()
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.mp4")
+
+    def tmp_path(self, key: str) -> str:
+        """Where to encode a missing segment (inside the cache dir, so put() is a rename)."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        return f"{self.path_for(key)[:-4]}.{os.getpid()}.tmp.mp4"
+
+    def get(self, key: str) -> str:
+        """Path of a cached segment, or None on a miss."""
+        path = self.path_for(key)
+        if os.path.exists(path):
+            os.utime(path)  # Mark as recently used for eviction
+            self.hits += 1
+            return path
+        self.misses += 1
+        return None
+
+    def put(self, key: str, rendered: str) -> str:
+        path = self.path_for(key)
+        os.replace(rendered, path)
+        self._evict_disk(keep=path)
+        return path
+
+    def _evict_disk(self, keep: str = None):
+        """Drop the least recently used segments beyond max_bytes (never `keep` or in-progress files)."""
+        files = []
+        for cached in Path(self.cache_dir).glob('*.mp4'):
+            if cached.name.endswith('.tmp.mp4'):
+                continue
+            try:
+                stat = cached.stat()
+            except FileNotFoundError:
+                continue  # Evicted by another process meanwhile
+            files.append((stat.st_mtime, stat.st_size, cached))
+        files.sort(key=lambda entry: entry[0], reverse=True)
+        total = 0
+        for _, size, cached in files:
+            total += size
+            if total > self.max_bytes and str(cached) != keep:
+                try:
+                    cached.unlink()
+                except OSError:
+                    pass
+
+_segment_cache = None
+
+def get_segment_cache() -> SegmentCache:
+    """Process-wide segment cache."""
+    global _segment_cache
+    if _segment_cache is None:
+        _segment_cache = SegmentCache()
+    return _segment_cache
+
+def write_concat_list(pieces: List[str], list_file: str) -> str:
+    """Write a concat demuxer list of `pieces` (absolute, quoted for ffmpeg) and return its path."""
+    with open(list_file, 'w', encoding='utf-8') as f:
+        for piece in pieces:
+            # The demuxer resolves relative entries against the list's directory
+            escaped = os.path.abspath(piece).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+    return list_file
+
+def stitch_pieces(pieces: List[str], output_filename: str, audio_inputs=(), audio_options=()):
+    """
+    Join video pieces that each start on a keyframe with a stream copy.
+    `audio_inputs` (input 1 onward) and `audio_options` add the audio,
+    which is encoded or copied once over the whole timeline.
+    """
+    with tempfile.TemporaryDirectory(prefix='stitch_', dir=os.path.dirname(os.path.abspath(output_filename))) as tmp_dir:
+        list_file = write_concat_list(pieces, os.path.join(tmp_dir, 'concat.txt'))
+        args = [FFMPEG_BINARY, '-hide_banner', '-loglevel', 'error', '-y', '-f', 'concat', '-safe', '0', '-i', list_file,
+                *audio_inputs, '-map', '0:v:0', '-c:v', 'copy', *audio_options, '-movflags', '+faststart',
+                output_filename]
+        subprocess.run(args, check=True)
+
+# Chunked encoding
+CHUNK_GOP_SECONDS = 2.0  # Keyframe interval of chunked encodes; chunk boundaries fall on multiples of it
+
+def chunk_bounds(nframes: int, chunks: int, gop: int) -> List[int]:
+    """Split output frames [0, nframes) into at most `chunks` near-equal runs that start on multiples of `gop`."""
+    bounds = [0]
+    for k in range(1, chunks):
+        cut = round(nframes * k / chunks / gop) * gop
+        if bounds[-1] < cut < nframes:
+            bounds.append(cut)
+    return bounds + [nframes]
+
+def encode_chunked(encode_chunk, nframes: int, fps: float, chunks: int, output_filename: str, threads: int = 0,
+                   audio=((), ())) -> int:
+    """
+    Encode a timeline of `nframes` output frames as up to `chunks`
+    GOP-aligned pieces, each in its own ffmpeg process, and stitch them
+    losslessly with `audio` = (inputs, options) for stitch_pieces.
+
+    encode_chunk(start, end, path, threads, gop) must write output frames
+    [start, end) to `path` as a closed-GOP encode with keyframe interval
+    `gop`, so every piece starts on a keyframe that needs nothing before
+    it. The encoder threads (0 = all cores) are split between the pieces.
+    Returns the number of pieces.
+    """
+    gop = max(1, round(fps * CHUNK_GOP_SECONDS))
+    bounds = chunk_bounds(nframes, chunks, gop)
+    count = len(bounds) - 1
+    chunk_threads = max(1, (threads or os.cpu_count() or 1) // count)
+    with tempfile.TemporaryDirectory(prefix='chunks_', dir=os.path.dirname(os.path.abspath(output_filename))) as tmp_dir:
+        pieces = [os.path.join(tmp_dir, f"chunk_{i:03d}.mp4") for i in range(count)]
+        # The encoders are child processes, so threads are enough to drive them in parallel
+        with ThreadPoolExecutor(max_workers=count) as executor:
+            futures = [executor.submit(encode_chunk, bounds[i], bounds[i + 1], pieces[i], chunk_threads, gop)
+                       for i in range(count)]
+            for future in futures:
+                future.result()
+        stitch_pieces(pieces, output_filename, *audio)
+    return count
 
 # Helper functions for the generate command
-def generate_cuts(video, cycle, length):
-    """Generate non-overlapping random cuts for the video."""
-    while True:
-        cuts = [getrandomDuration(video.duration, length) for _ in range(cycle)]
-        cts = list({tuple(cut): None for cut in cuts}.keys())
-        if not detect_overlapping_tuples(cts):
-            break
-    return cts
-
-def process_clip(video, cut):
-    """Process a single video clip with a crossfade effect."""
-    return video.subclip(cut[0], cut[1]).crossfadein(1)
-
-def edit_video(config, logger, iteration=1):
-    """Edit video based on configuration."""
+def generate_cuts(video_duration, cycle, length, min_gap=0.0, seed=None):
+    """Generate non-overlapping random cuts for a video of the given duration."""
+    return sample_cuts(video_duration, cycle, length, min_gap=min_gap, seed=seed)
+
+def tag_rotation(path, angle):
+    """Set the display-matrix rotation (counterclockwise degrees) by remuxing, without touching pixels."""
+    tmp_path = f"{path}.rotate.tmp{os.path.splitext(path)[1]}"
+    subprocess.run(
+        [FFMPEG_BINARY, '-hide_banner', '-loglevel', 'error', '-y',
+         '-display_rotation:v:0', str(angle), '-i', path,
+         '-map', '0', '-c', 'copy', tmp_path],
+        check=True
+    )
+    os.replace(tmp_path, path)
+
+def logo_placement(logo_rgba, position, frame_height, rotate_mode):
+    """
+    Where to draw a logo on the unrotated frame so that it lands at
+    `position` once the 270° display rotation is applied ("metadata" mode).
+    `logo_rgba` is the logo already turned to match the unrotated frame.
+    """
+    if rotate_mode != "metadata":
+        return position
+    x, y = position
+    return (y, frame_height - x - logo_rgba.shape[0])
+
+# The moviepy pipeline applied the crossfadein mask twice (compose
+# concatenation, then the logo composite), so the fade-in ramp is
+# (t/d)**FADE_IN_POWER. Both backends build their fade from these two.
+FADE_IN_POWER = 2
+
+def fade_in_gain(t, duration):
+    """Fade-in brightness at `t` seconds into a `duration`-long fade, in 1/256 steps."""
+    return int((t / duration) ** FADE_IN_POWER * 256)
+
+def fade_in_filters(duration):
+    """The same ramp as fade_in_gain as ffmpeg filters: each linear fade multiplies in one power."""
+    return [f"fade=t=in:st=0:d={duration:.3f}"] * FADE_IN_POWER
+
+class EditRenderer:
+    """
+    Frame loop of the generate command's Python backend.
+
+    Produces the same picture as compose-concatenating the cuts with a 1s
+    fade-in each, speeding up, rotating and overlaying the logo, but every
+    stage writes into the caller's output buffer: the source frame comes
+    from a BufferedFrameReader, rotation is a strided NumPy copy, the fade
+    runs on a preallocated uint16 scratch frame and a LogoOverlay blends
+    the watermark in place. Operands are cast with np.copyto and kept
+    dtype-matched so ufuncs need no temporary buffers.
+    """
+
+    fade = 1.0
+
+    def __init__(self, input_video, info, cuts, speed, rotate_pixels, logo_rgba, logo_position, fps=30,
+                 logo_span=(0.0, None)):
+        self.reader = BufferedFrameReader(str(Path(input_video).resolve()), info)
+        self.cuts = cuts
+        self.speed = speed
+        self.fps = fps
+        self.rotate_pixels = rotate_pixels
+        self.bounds = [0.0]
+        for start, end in cuts:
+            self.bounds.append(self.bounds[-1] + end - start)
+        self.duration = self.bounds[-1] / speed
+        self.nframes = int(np.ceil(self.duration * fps - 1e-9))
+        width, height = info['width'], info['height']
+        self.size = (height, width) if rotate_pixels else (width, height)
+        self.fade_scratch = np.empty((self.size[1], self.size[0], 3), dtype=np.uint16)
+        # Rotated views of the reader's buffers are built once, not per frame
+        self.views = {id(buffer): np.rot90(buffer, 3) if rotate_pixels else buffer
+                      for buffer in self.reader.buffers}
+        self.overlay = LogoOverlay(logo_rgba, logo_position, self.size, *logo_span)
+
+    def render_into(self, n, frame):
+        t = n * self.speed / self.fps
+        i = min(bisect_right(self.bounds, t) - 1, len(self.cuts) - 1)
+        local = t - self.bounds[i]
+        source = self.views[id(self.reader.get_frame(self.cuts[i][0] + local))]
+        if local < self.fade:
+            scratch = self.fade_scratch
+            np.copyto(scratch, source)
+            np.multiply(scratch, fade_in_gain(local, self.fade), out=scratch)
+            np.right_shift(scratch, 8, out=scratch)
+            np.copyto(frame, scratch, casting='unsafe')
+        else:
+            np.copyto(frame, source)
+        self.overlay.blend(frame, n / self.fps)
+
+    def close(self):
+        self.reader.close()
+
+def plan_generate(config, logger, iteration=1, job_id=None, backend=None):
+    """Turn one generate configuration into an edit decision list. Returns None if an input is missing."""
     # Extract configuration
     input_video = config.get("input_video")
     music = config.get("music")
     cycle = config.get("cycle", 4)
     no_rotate = config.get("no_rotate", False)
+    rotate_mode = "none" if no_rotate else config.get("rotate_mode", "pixels")
     speed = config.get("speed", 1.2)
     output = config.get("output", "")
     logo_text = config.get("logo_text", "UTOPIA")
     font = config.get("font", "./fonts/Anurati-Regular.otf")
     cut_size = config.get("cut_size", 5)
+    seed = config.get("seed")
+    backend = backend or config.get("backend", "moviepy")
 
     # Input validation
     if not os.path.exists(input_video):
@@ -356,82 +1821,922 @@ def edit_video(config, logger, iteration=1):
     logger.info(f"Processing video: {input_video}")
     logger.info(f"Using music: {music}")
 
+    # Determine output filename
+    if not output:
+        dt = datetime.now().strftime("%Y%m%d%H%M%S")
+        if job_id is None:
+            output_filename = f"./dist/final_{dt}_{iteration}.mp4"
+        else:
+            output_filename = f"./dist/final_{dt}_{job_id}_{iteration}.mp4"
+    else:
+        name, ext = os.path.splitext(output)
+        output_filename = f"{name}_{iteration}{ext}"
+
+    # Plan cuts from cached metadata; nothing is decoded until render
+    info = probe_media(input_video)
+    with spans.span('plan_cuts', cuts=cycle):
+        cts = generate_cuts(info['duration'], cycle, cut_size,
+                            seed=None if seed is None else seed + iteration - 1)
+
+    return {
+        'version': PLAN_VERSION,
+        'kind': 'generate',
+        'output': output_filename,
+        'backend': backend,
+        'fps': 30,
+        'size': [info['width'], info['height']],
+        'segments': [plan_segment(input_video, start, end, speed, fade_in=EditRenderer.fade) for start, end in cts],
+        'rotation': rotate_mode,
+        'logo': {
+            'text': logo_text, 'font': str(Path(font).resolve()), 'fontsize': 30, 'color': 'white', 'opacity': 0.7,
+            'position': [60, 60], 'start': config.get("logo_start", 0.0), 'end': config.get("logo_end"),
+        },
+        'audio': {'track': str(Path(music).resolve()), 'fade_in': 2.0, 'fade_out': 1.0},
+        'encode': {'codec': 'libx264', 'preset': 'ultrafast', 'crf': 30},
+    }
+
+def edit_video(config, logger, iteration=1, threads=6, job_id=None, backend=None, cache_segments=False, chunks=1):
+    """Edit video based on configuration. Returns the output filename, or None on failure."""
     try:
-        video = mpy.VideoFileClip(input_video, audio=False)
-        cts = generate_cuts(video, cycle, cut_size)
-
-        # Process clips sequentially
-        clips = [process_clip(video, cut) for cut in cts]
+        plan = plan_generate(config, logger, iteration, job_id=job_id, backend=backend)
+        if plan is None:
+            return None
+        output_filename = render_plan(plan, logger, threads=threads, cache_segments=cache_segments, chunks=chunks)
+        logger.info(f"Successfully processed video: {output_filename}")
+        return output_filename
 
-        final_clip = mpy.concatenate_videoclips(clips, method="compose").fx(speedx, speed)
+    except Exception as e:
+        logger.error(f"Error processing video: {str(e)}")
+        return None
 
-        if not no_rotate:
-            final_clip = final_clip.fx(rotate, 270)
+def encoder_threads_per_job(jobs):
+    """Split the machine's cores evenly between concurrent jobs (at least one thread each)."""
+    return max(1, (os.cpu_count() or 1) // jobs)
 
-        audio = mpy.AudioFileClip(music)
-        new_audioclip = mpy.CompositeAudioClip([audio])
-        new_audioclip = new_audioclip.set_duration(final_clip.duration)
-        new_audioclip = new_audioclip.fx(audio_fadein, duration=2.0)
-        new_audioclip = new_audioclip.fx(audio_fadeout, duration=1.0)
-        final_clip = final_clip.set_audio(new_audioclip)
+def run_generate_job(video_config, iteration, job_id, threads, backend=None, cache_segments=False, chunks=1):
+    """Run one (video_config, iteration) unit in a worker process, logging to its own file."""
+    os.makedirs('./logs', exist_ok=True)
+    log_filename = f"./logs/generate_job{job_id}_{iteration}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
 
-        logo = (
-            mpy.TextClip(logo_text, fontsize=30, color="white", font=font)
-            .set_position((60, 60))
-            .set_opacity(0.7)
-            .set_duration(final_clip.duration)
-        )
+    logger = logging.getLogger(f"{__name__}.job{job_id}.{iteration}")
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    file_handler = logging.FileHandler(log_filename, encoding='utf-8')
+    file_handler.setFormatter(logging.Formatter(
+        '%(asctime)s - %(levelname)s - %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S'
+    ))
+    logger.addHandler(file_handler)
 
-        final = mpy.CompositeVideoClip([final_clip, logo])
-        final = final.set_fps(30)
+    # Spans are handed back to the parent, which writes and aggregates them
+    spans.log_file = None
+    spans.records = []
+    spans.command = 'generate'
 
-        # Determine output filename
-        if not output:
-            dt = datetime.now().strftime("%Y%m%d%H%M%S")
-            output_filename = f"./dist/final_{dt}_{iteration}.mp4"
+    start = time.perf_counter()
+    try:
+        output = edit_video(video_config, logger, iteration, threads=threads, job_id=job_id, backend=backend,
+                            cache_segments=cache_segments, chunks=chunks)
+    finally:
+        logger.removeHandler(file_handler)
+        file_handler.close()
+
+    return output, time.perf_counter() - start, log_filename, spans.records
+
+def config_units(config_data):
+    """Expand a generate config into (video_config, iteration, job_id) units of work."""
+    # Each (video_config, iteration) pair is an independent unit of work
+    if "videos" in config_data:
+        return [
+            (video_config, j + 1, i)
+            for i, video_config in enumerate(config_data["videos"], 1)
+            for j in range(video_config.get("repeat", 1))
+        ]
+    return [(config_data, 1, 1)]
+
+# Edit decision lists (plan / render)
+PLAN_VERSION = 1
+DRAFT_SIZE = 360  # Short side of --draft renders
+DRAFT_CRF = 35
+
+def plan_segment(source, start, end, speed=1.0, fade_in=0.0) -> dict:
+    """One EDL entry: [in, out) of `source` in source seconds, played at `speed` after a fade from black."""
+    return {'source': str(Path(source).resolve()), 'in': float(start), 'out': float(end),
+            'speed': float(speed), 'fade_in': float(fade_in)}
+
+def plan_duration(plan) -> float:
+    """Output length of an EDL in seconds."""
+    return sum((seg['out'] - seg['in']) / seg['speed'] for seg in plan['segments'])
+
+def plan_frames(plan) -> int:
+    """Output frame count of an EDL, the same in every renderer (EditRenderer.nframes)."""
+    return max(1, int(np.ceil(plan_duration(plan) * plan['fps'] - 1e-9)))
+
+def save_plan(plan, path):
+    """Write an EDL as indented JSON, replacing any previous file atomically."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(plan, f, indent=2)
+    os.replace(tmp_path, path)
+
+def load_plan(path) -> dict:
+    with open(path, 'r', encoding='utf-8') as f:
+        plan = json.load(f)
+    if plan.get('version') != PLAN_VERSION or plan.get('kind') not in ('generate', 'remix'):
+        raise ValueError(f"{path} is not a version {PLAN_VERSION} generate/remix plan")
+    if not plan.get('segments'):
+        raise ValueError(f"{path} has no segments")
+    return plan
+
+def partial_output(output):
+    """Name an output is rendered under until complete (same directory, so the final rename is atomic)."""
+    name, ext = os.path.splitext(output)
+    return f"{name}.{os.getpid()}.partial{ext}"
+
+def draft_output(output):
+    name, ext = os.path.splitext(output)
+    return f"{name}_draft{ext}"
+
+def plan_logo(logo, rotate_mode, frame_height):
+    """
+    Fetch an EDL logo from the logo cache. Returns (premultiplied RGBA,
+    PNG path, position on the unrotated frame, (start, end) span).
+    """
+    # In metadata mode the pixels stay unrotated, so the logo is turned and placed to match
+    rgba, path = get_logo_cache().get(
+        logo['text'], logo['font'], fontsize=logo['fontsize'], color=logo['color'], opacity=logo['opacity'],
+        quarter_turns=1 if rotate_mode == "metadata" else 0
+    )
+    position = logo_placement(rgba, tuple(logo['position']), frame_height, rotate_mode)
+    return rgba, path, position, (logo['start'], logo['end'])
+
+def build_plan_filtergraph(plan, canvas, fit, logo_index=None, logo_position=(0, 0), logo_span=(0.0, None),
+                           logo_size=None, audio_index=None, pad_frames=0):
+    """
+    Compile an EDL into one filter_complex.
+
+    Mirrors the Python frame loop: each segment (one input per segment,
+    trimmed by input seeking) fades in from black over its `fade_in`
+    seconds and is sped up, the segments are concatenated, rotated 270°
+    (= 90° clockwise) in pixels mode, watermarked with the cached
+    premultiplied logo during `logo_span` and resampled to the plan's fps,
+    and the audio track is trimmed to the final length with its fades.
+    With `fit` every segment is scaled and padded to `canvas` first
+    (sources of different sizes, or a draft render). A segment's `skip`
+    (output seconds) drops its head after the fade and speed-up, for
+    pieces that start part-way into a fade. `pad_frames` repeats the last
+    output frame so that a frame count cut can always be met.
+    """
+    width, height = canvas
+    filters = []
+    for i, seg in enumerate(plan['segments']):
+        chain = ["setpts=PTS-STARTPTS"]
+        if fit:
+            chain += [f"scale={width}:{height}:force_original_aspect_ratio=decrease",
+                      f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2", "setsar=1"]
+        fade = min(seg['fade_in'], seg['out'] - seg['in'])
+        if fade > 0:
+            chain += fade_in_filters(fade)
+        if seg['speed'] != 1:
+            chain.append(f"setpts=PTS/{seg['speed']}")
+        if seg.get('skip'):
+            chain.append(f"trim=start={seg['skip']:.6f},setpts=PTS-STARTPTS")
+        filters.append(f"[{i}:v:0]{','.join(chain)}[v{i}]")
+
+    count = len(plan['segments'])
+    video_chain = [f"concat=n={count}:v=1:a=0"]
+    if plan['rotation'] == "pixels":
+        video_chain.append("transpose=1")
+    labels = ''.join(f"[v{i}]" for i in range(count))
+    output_chain = f"fps={plan['fps']},format=yuv420p[vout]"
+    if pad_frames:
+        output_chain = f"fps={plan['fps']},tpad=stop_mode=clone:stop={pad_frames},format=yuv420p[vout]"
+    if logo_index is None:
+        filters.append(f"{labels}{','.join(video_chain + [output_chain])}")
+    else:
+        filters.append(f"{labels}{','.join(video_chain)}[vmain]")
+        logo_label = f"[{logo_index}:v:0]"
+        if logo_size:
+            filters.append(f"{logo_label}scale={logo_size[0]}:{logo_size[1]}[logo]")
+            logo_label = "[logo]"
+        logo_x, logo_y = logo_position
+        overlay = f"overlay={logo_x}:{logo_y}:alpha=premultiplied"
+        logo_start, logo_end = logo_span
+        if logo_end is not None:
+            overlay += f":enable='between(t,{logo_start:.3f},{logo_end:.3f})'"
+        elif logo_start > 0:
+            overlay += f":enable='gte(t,{logo_start:.3f})'"
+        filters.append(f"[vmain]{logo_label}{overlay},{output_chain}")
+
+    if audio_index is not None:
+        filters.append(build_audio_filter(plan, audio_index))
+    return ';'.join(filters)
+
+def build_audio_filter(plan, audio_index):
+    """Trim an EDL's audio track (input `audio_index`) to the output length and apply its fades as [aout]."""
+    audio = plan['audio']
+    duration = plan_duration(plan)
+    chain = [f"atrim=0:{duration:.3f}", "asetpts=PTS-STARTPTS"]
+    if audio['fade_in'] > 0:
+        chain.append(f"afade=t=in:st=0:d={audio['fade_in']}")
+    if audio['fade_out'] > 0:
+        chain.append(f"afade=t=out:st={max(0.0, duration - audio['fade_out']):.3f}:d={audio['fade_out']}")
+    return f"[{audio_index}:a:0]{','.join(chain)}[aout]"
+
+def plan_needs_fit(plan) -> bool:
+    """True when some source's frame size differs from the plan's."""
+    return any((info['width'], info['height']) != tuple(plan['size'])
+               for info in map(probe_media, {seg['source'] for seg in plan['segments']}))
+
+def render_plan_ffmpeg(plan, output_filename, threads, draft=False, fit=None, frames=None, gop=None):
+    """
+    Render an EDL in a single native ffmpeg process. A draft is scaled so
+    its short side is DRAFT_SIZE and encoded with the fastest preset.
+    `frames` fixes the exact number of output frames; `gop` makes the
+    encode closed-GOP with that keyframe interval.
+    """
+    segments = plan['segments']
+    width, height = plan['size']
+    scale = min(1.0, DRAFT_SIZE / min(width, height)) if draft else 1.0
+    canvas = (max(2, round(width * scale / 2) * 2), max(2, round(height * scale / 2) * 2))
+    if fit is None:
+        fit = draft or plan_needs_fit(plan)
+
+    args = [FFMPEG_BINARY, '-hide_banner', '-loglevel', 'error', '-y']
+    # Input-side seeking decodes only the frames each segment needs
+    for seg in segments:
+        args += ['-ss', f"{seg['in']:.6f}", '-t', f"{seg['out'] - seg['in']:.6f}", '-an', '-i', seg['source']]
+
+    graph = {}
+    index = len(segments)
+    if plan.get('logo'):
+        with spans.span('logo'):
+            rgba, logo_path, position, span = plan_logo(plan['logo'], plan['rotation'], height)
+        args += ['-i', logo_path]
+        graph.update(logo_index=index, logo_position=(round(position[0] * scale), round(position[1] * scale)),
+                     logo_span=span)
+        if scale < 1:
+            graph['logo_size'] = (max(1, round(rgba.shape[1] * scale)), max(1, round(rgba.shape[0] * scale)))
+        index += 1
+    if plan.get('audio'):
+        args += ['-i', plan['audio']['track']]
+        graph['audio_index'] = index
+
+    encode = plan['encode']
+    if frames:
+        graph['pad_frames'] = 2
+    args += ['-filter_complex', build_plan_filtergraph(plan, canvas, fit, **graph), '-map', '[vout]']
+    if frames:
+        args += ['-frames:v', str(frames)]
+    if plan.get('audio'):
+        args += ['-map', '[aout]', '-c:a', 'aac', '-shortest']
+    args += ['-c:v', encode['codec'],
+             '-preset', 'ultrafast' if draft else encode['preset'],
+             '-crf', str(DRAFT_CRF if draft else encode['crf']),
+             '-threads', str(threads)]
+    if gop:
+        args += ['-g', str(gop), '-flags', '+cgop']
+    args.append(output_filename)
+    subprocess.run(args, check=True)
+
+def shift_logo(logo, offset, duration):
+    """
+    An EDL logo moved to the time base of a piece that starts at output
+    time `offset` and lasts `duration`: dropped or opened up when its
+    window misses or covers the whole piece.
+    """
+    if not logo:
+        return logo
+    start = logo['start'] - offset
+    end = None if logo['end'] is None else logo['end'] - offset
+    if start >= duration or (end is not None and end <= 0):
+        return None
+    return dict(logo, start=max(start, 0.0), end=None if end is None or end >= duration else end)
+
+def segment_subplan(plan, seg, offset):
+    """
+    One segment of an EDL as a plan of its own starting at output time
+    `offset`: no audio, and the logo window moved to segment time (so the
+    piece does not depend on where the segment sits).
+    """
+    duration = (seg['out'] - seg['in']) / seg['speed']
+    return dict(plan, segments=[seg], logo=shift_logo(plan.get('logo'), offset, duration), audio=None)
+
+def split_plan(plan, start, end):
+    """
+    The part of an EDL from output time `start` to `end` as a plan of its
+    own (no audio, logo window moved to chunk time). A segment entered past
+    its fade-in is seeked to the cut; one entered during the fade keeps
+    its in point and skips the head, so the fade carries on. The last
+    segment keeps its out point: the caller cuts the frame count.
+    """
+    segments = []
+    offset = 0.0
+    for seg in plan['segments']:
+        duration = (seg['out'] - seg['in']) / seg['speed']
+        head = start - offset
+        if offset < end - 1e-6 and head < duration - 1e-6:
+            piece = dict(seg)
+            if head * seg['speed'] >= seg['fade_in']:
+                piece.update({'in': seg['in'] + max(head, 0.0) * seg['speed'], 'fade_in': 0.0})
+            elif head > 0:
+                piece['skip'] = head
+            segments.append(piece)
+        offset += duration
+    return dict(plan, segments=segments, logo=shift_logo(plan.get('logo'), start, end - start), audio=None)
+
+def plan_audio_args(plan, audio_index=1):
+    """Stitch inputs and options that encode an EDL's soundtrack (input `audio_index`) over the whole timeline."""
+    if not plan.get('audio'):
+        return [], []
+    return (['-i', plan['audio']['track']],
+            ['-filter_complex', build_audio_filter(plan, audio_index), '-map', '[aout]', '-c:a', 'aac', '-shortest'])
+
+def render_plan_segments(plan, output_filename, threads, segment_cache, draft=False):
+    """
+    Render an EDL one segment at a time through the segment cache and
+    stitch the pieces with a stream copy; only the soundtrack is encoded
+    in the final pass. Every piece is a separate encode with the plan's
+    profile, so each starts on a keyframe and the concat is lossless.
+    Pieces are a whole number of frames (the segment length rounded), so
+    they do not depend on where in the timeline a segment lands.
+    """
+    fit = draft or plan_needs_fit(plan)
+    pieces = []
+    offset = 0.0
+    for seg in plan['segments']:
+        sub = segment_subplan(plan, seg, offset)
+        duration = (seg['out'] - seg['in']) / seg['speed']
+        frames = max(1, round(duration * plan['fps']))
+        offset += duration
+        key = segment_cache.key(seg['source'], {
+            'segment': {name: seg[name] for name in ('in', 'out', 'speed', 'fade_in')},
+            'rotation': sub['rotation'], 'logo': sub['logo'], 'fps': sub['fps'], 'size': sub['size'],
+            'encode': sub['encode'], 'fit': fit, 'draft': draft,
+        })
+        piece = segment_cache.get(key)
+        if piece is None:
+            tmp_path = segment_cache.tmp_path(key)
+            try:
+                render_plan_ffmpeg(sub, tmp_path, threads, draft, fit=fit, frames=frames)
+                piece = segment_cache.put(key, tmp_path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+        pieces.append(piece)
+
+    stitch_pieces(pieces, output_filename, *plan_audio_args(plan))
+
+def render_plan_chunked(plan, output_filename, threads, chunks, draft=False, audio=None):
+    """
+    Render an EDL as up to `chunks` GOP-aligned pieces in parallel ffmpeg
+    processes (encode_chunked). Each chunk renders its part of the
+    timeline from split_plan; the soundtrack, or `audio` = (inputs,
+    options) for stitch_pieces, is encoded once in the stitch pass so it
+    runs on without seams. Returns the number of chunks.
+    """
+    fps = plan['fps']
+    fit = draft or plan_needs_fit(plan)
+    if plan.get('logo'):
+        # Fill the logo cache before the chunks look it up concurrently
+        plan_logo(plan['logo'], plan['rotation'], plan['size'][1])
+
+    def encode_chunk(start, end, path, chunk_threads, gop):
+        render_plan_ffmpeg(split_plan(plan, start / fps, end / fps), path, chunk_threads, draft, fit=fit,
+                           frames=end - start, gop=gop)
+
+    return encode_chunked(encode_chunk, plan_frames(plan), fps, chunks, output_filename, threads,
+                          audio=audio or plan_audio_args(plan))
+
+def render_plan_frames(plan, output_filename, threads):
+    """Render a single-source, constant-speed EDL with the in-place Python frame loop (EditRenderer)."""
+    source = plan['segments'][0]['source']
+    speed = plan['segments'][0]['speed']
+    info = probe_media(source)
+    logo_rgba, logo_position, logo_span = np.zeros((1, 1, 4), dtype=np.uint8), (0, 0), (0.0, None)
+    if plan.get('logo'):
+        with spans.span('logo'):
+            logo_rgba, _, logo_position, logo_span = plan_logo(plan['logo'], plan['rotation'], info['height'])
+
+    renderer = EditRenderer(source, info, [(seg['in'], seg['out']) for seg in plan['segments']], speed,
+                            plan['rotation'] == "pixels", logo_rgba, logo_position, fps=plan['fps'],
+                            logo_span=logo_span)
+    audio = plan.get('audio')
+    audio_filename = f"{os.path.splitext(output_filename)[0]}.audio.f32" if audio else None
+    encode = plan['encode']
+    try:
+        if audio:
+            with spans.span('audio') as record:
+                write_soundtrack(audio['track'], renderer.duration, audio_filename, audio['fade_in'], audio['fade_out'])
+                record['bytes'] = output_size(audio_filename)
+
+        pipeline = {'span': 'frame_pipeline', 'duration_s': 0.0, 'frames': renderer.nframes}
+        with spans.span('encode', frames=renderer.nframes) as record:
+            with FrameWriter(output_filename, renderer.size, plan['fps'], audio=audio_filename,
+                             codec=encode['codec'], preset=encode['preset'], crf=encode['crf'], threads=threads,
+                             audio_format=('f32le', 44100, SoundtrackCache.CHANNELS)) as writer:
+                for n in range(renderer.nframes):
+                    start = time.perf_counter()
+                    renderer.render_into(n, writer.frame)
+                    pipeline['duration_s'] += time.perf_counter() - start
+                    writer.write()
+            record['bytes'] = output_size(output_filename)
+        spans.add(pipeline)
+    finally:
+        renderer.close()
+        if audio_filename and os.path.exists(audio_filename):
+            os.remove(audio_filename)
+
+def render_plan(plan, logger=None, threads=0, draft=False, output=None, max_decoders=4, cache_segments=False,
+                chunks=1):
+    """
+    Render an EDL and return the output filename.
+
+    Full renders use the plan's backend/engine and record the cuts in the
+    cut history (remix plans also update the used-segment store when
+    planned with avoid_reuse); drafts always go through the ffmpeg
+    filtergraph and leave no history behind. With `cache_segments` the
+    segments go through the segment cache and are stitched by stream copy;
+    otherwise `chunks` > 1 encodes the timeline in that many parallel
+    GOP-aligned chunks (render_plan_chunked).
+    """
+    logger = logger or logging.getLogger(__name__)
+    output_filename = output or (draft_output(plan['output']) if draft else plan['output'])
+    os.makedirs(os.path.dirname(os.path.abspath(output_filename)), exist_ok=True)
+
+    if plan['kind'] == 'remix' and not draft:
+        segment_store = UsedSegmentStore(expiry_days=plan['reuse_expiry']) if plan['avoid_reuse'] else None
+        processor = VideoProcessor(engine=plan['engine'], segment_store=segment_store, max_open_readers=max_decoders,
+                                   segment_cache=get_segment_cache() if cache_segments else None, chunks=chunks)
+        return processor.render_plan(plan, output_filename)
+
+    segments = plan['segments']
+    chunked = chunks > 1 and not cache_segments
+    use_frames = (not draft and not cache_segments and not chunked and plan.get('backend') == "moviepy"
+                  and len({(seg['source'], seg['speed'], seg['fade_in']) for seg in segments}) == 1
+                  and segments[0]['fade_in'] == EditRenderer.fade)
+    if not draft and not cache_segments and not chunked and plan.get('backend') == "moviepy" and not use_frames:
+        logger.info("Plan mixes sources, speeds or fades, rendering with the ffmpeg backend")
+
+    # Readers of the output path only ever see a complete file
+    partial = partial_output(output_filename)
+    try:
+        if cache_segments:
+            segment_cache = get_segment_cache()
+            hits, misses = segment_cache.hits, segment_cache.misses
+            logger.info(f"Rendering {'draft ' if draft else ''}from cached segments to: {output_filename}")
+            with spans.span('segment_render', frames=int(plan_duration(plan) * plan['fps']), draft=draft) as record:
+                render_plan_segments(plan, partial, threads, segment_cache, draft)
+                record['bytes'] = output_size(partial)
+                record['cache_hits'] = segment_cache.hits - hits
+                record['cache_misses'] = segment_cache.misses - misses
+            logger.info(f"Stitched {len(segments)} segments: {record['cache_hits']} cached, "
+                        f"{record['cache_misses']} encoded")
+        elif chunked:
+            logger.info(f"Rendering {'draft ' if draft else ''}in {chunks} parallel chunks to: {output_filename}")
+            with spans.span('chunked_render', frames=plan_frames(plan), draft=draft) as record:
+                record['chunks'] = render_plan_chunked(plan, partial, threads, chunks, draft)
+                record['bytes'] = output_size(partial)
+        elif use_frames:
+            logger.info(f"Writing video to: {output_filename}")
+            render_plan_frames(plan, partial, threads)
         else:
-            name, ext = os.path.splitext(output)
-            output_filename = f"{name}_{iteration}{ext}"
-
-        # Ensure dist directory exists
-        os.makedirs('./dist', exist_ok=True)
-
-        logger.info(f"Writing video to: {output_filename}")
-        final.write_videofile(
-            output_filename,
-            threads=6,
-            fps=30,
-            codec="libx264",
-            preset="ultrafast",
-            ffmpeg_params=["-crf", "30"],
-            audio_codec="aac",
-        )
+            logger.info(f"Rendering {'draft ' if draft else ''}with ffmpeg filtergraph to: {output_filename}")
+            # The frame count is fixed: the fps filter can drop the last frame after an overlay
+            frames = plan_frames(plan)
+            with spans.span('ffmpeg_render', frames=frames, draft=draft) as record:
+                render_plan_ffmpeg(plan, partial, threads, draft, frames=frames)
+                record['bytes'] = output_size(partial)
+
+        if plan['rotation'] == "metadata":
+            tag_rotation(partial, 270)
+        os.replace(partial, output_filename)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+
+    if not draft:
+        record_cuts([(seg['source'], seg['in'], seg['out'], seg['speed']) for seg in segments],
+                    output_filename, plan['kind'])
+    return output_filename
+
+# Render queue
+class JobQueue:
+    """
+    Durable queue of render jobs in SQLite, one row per EDL.
+
+    Workers claim the oldest runnable job in a single UPDATE, keep a
+    heartbeat while rendering and mark it done or schedule a retry with
+    exponential backoff. A job whose worker died (dead pid on this host,
+    or no heartbeat for `lease` seconds) goes back to the queue, so
+    restarted workers resume where the batch left off.
+    """
+
+    def __init__(self, db_path: str = './cache/jobs.sqlite'):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        with self.connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id INTEGER PRIMARY KEY,"
+                " plan TEXT NOT NULL,"
+                " output TEXT NOT NULL,"
+                " draft INTEGER NOT NULL DEFAULT 0,"
+                " state TEXT NOT NULL DEFAULT 'queued',"
+                " attempts INTEGER NOT NULL DEFAULT 0,"
+                " max_attempts INTEGER NOT NULL DEFAULT 3,"
+                " not_before REAL NOT NULL DEFAULT 0,"
+                " worker TEXT,"
+                " heartbeat REAL,"
+                " error TEXT,"
+                " created_at TEXT NOT NULL,"
+                " finished_at TEXT)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_state ON jobs (state, not_before)")
 
-        logger.info(f"Successfully processed video: {output_filename}")
-        video.close()
+    @contextmanager
+    def connect(self):
+        """Open a connection, commit on success, and always close it."""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def enqueue(self, plans: List[dict], draft: bool = False, max_attempts: int = 3) -> List[int]:
+        """Add one job per plan in a single transaction and return their ids."""
+        created_at = datetime.now().isoformat(timespec='seconds')
+        ids = []
+        with self.connect() as conn:
+            for plan in plans:
+                output = draft_output(plan['output']) if draft else plan['output']
+                cursor = conn.execute(
+                    "INSERT INTO jobs (plan, output, draft, max_attempts, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (json.dumps(plan), str(Path(output).resolve()), int(draft), max_attempts, created_at)
+                )
+                ids.append(cursor.lastrowid)
+        return ids
+
+    @staticmethod
+    def worker_id() -> str:
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    def recover(self, lease: float) -> int:
+        """Requeue running jobs whose worker is gone: a dead pid on this host or a heartbeat older than `lease`."""
+        host = socket.gethostname()
+        stale = []
+        with self.connect() as conn:
+            for row in conn.execute("SELECT id, worker, heartbeat FROM jobs WHERE state = 'running'"):
+                worker_host, _, pid = row['worker'].rpartition(':')
+                if row['heartbeat'] < time.time() - lease or (worker_host == host and not pid_alive(int(pid))):
+                    stale.append(row['id'])
+            # A job that keeps killing its worker (e.g. out of memory) still runs out of attempts
+            conn.executemany(
+                "UPDATE jobs SET state = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'queued' END,"
+                " worker = NULL, error = 'worker lost' WHERE id = ? AND state = 'running'",
+                [(job_id,) for job_id in stale]
+            )
+        return len(stale)
+
+    def claim(self) -> dict:
+        """Take the oldest runnable job for this process, or None if nothing is due."""
+        worker = self.worker_id()
+        now = time.time()
+        with self.connect() as conn:
+            claimed = conn.execute(
+                "UPDATE jobs SET state = 'running', worker = ?, heartbeat = ?, attempts = attempts + 1"
+                " WHERE id = (SELECT id FROM jobs WHERE state = 'queued' AND not_before <= ? ORDER BY id LIMIT 1)"
+                " AND state = 'queued'",
+                (worker, now, now)
+            ).rowcount
+            if not claimed:
+                return None
+            row = conn.execute("SELECT * FROM jobs WHERE state = 'running' AND worker = ? ORDER BY heartbeat DESC LIMIT 1",
+                               (worker,)).fetchone()
+        return dict(row)
+
+    # The updates below only touch a job still running under `worker`: once
+    # recover() has handed it to someone else, the old worker must not
+    # overwrite the new attempt's state.
+
+    def heartbeat(self, job_id: int, worker: str) -> bool:
+        """Refresh the job's heartbeat; returns False if `worker` no longer holds it."""
+        with self.connect() as conn:
+            return conn.execute(
+                "UPDATE jobs SET heartbeat = ? WHERE id = ? AND worker = ? AND state = 'running'",
+                (time.time(), job_id, worker)
+            ).rowcount > 0
+
+    def complete(self, job_id: int, worker: str) -> bool:
+        """Mark the job done; returns False if `worker` no longer holds it."""
+        with self.connect() as conn:
+            return conn.execute(
+                "UPDATE jobs SET state = 'done', error = NULL, finished_at = ?"
+                " WHERE id = ? AND worker = ? AND state = 'running'",
+                (datetime.now().isoformat(timespec='seconds'), job_id, worker)
+            ).rowcount > 0
+
+    def fail(self, job_id: int, worker: str, error: str, backoff: float) -> bool:
+        """
+        Record a failed attempt; returns True if the job will run again,
+        either requeued here or already taken back by recover().
+        """
+        with self.connect() as conn:
+            row = conn.execute("SELECT attempts, max_attempts FROM jobs WHERE id = ? AND worker = ? AND state = 'running'",
+                               (job_id, worker)).fetchone()
+            if row is None:
+                return conn.execute("SELECT state FROM jobs WHERE id = ?", (job_id,)).fetchone()['state'] != 'failed'
+            if row['attempts'] < row['max_attempts']:
+                conn.execute(
+                    "UPDATE jobs SET state = 'queued', worker = NULL, error = ?, not_before = ?"
+                    " WHERE id = ? AND worker = ? AND state = 'running'",
+                    (error, time.time() + backoff * 2 ** (row['attempts'] - 1), job_id, worker)
+                )
+                return True
+            conn.execute(
+                "UPDATE jobs SET state = 'failed', error = ?, finished_at = ?"
+                " WHERE id = ? AND worker = ? AND state = 'running'",
+                (error, datetime.now().isoformat(timespec='seconds'), job_id, worker)
+            )
+            return False
+
+    def retry_failed(self) -> int:
+        """Give every failed job a fresh set of attempts."""
+        with self.connect() as conn:
+            return conn.execute(
+                "UPDATE jobs SET state = 'queued', attempts = 0, not_before = 0, finished_at = NULL WHERE state = 'failed'"
+            ).rowcount
+
+    def pending(self) -> int:
+        """Jobs that still have work ahead of them (queued, including backoff, or running)."""
+        with self.connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM jobs WHERE state IN ('queued', 'running')").fetchone()[0]
+
+    def counts(self) -> Dict[str, int]:
+        with self.connect() as conn:
+            return dict(conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+
+    def jobs(self, states: Tuple[str, ...] = ('queued', 'running', 'failed')) -> List[dict]:
+        placeholders = ','.join('?' * len(states))
+        with self.connect() as conn:
+            return [dict(row) for row in conn.execute(
+                f"SELECT id, output, state, attempts, max_attempts, not_before, worker, error FROM jobs"
+                f" WHERE state IN ({placeholders}) ORDER BY id", states
+            )]
+
+def pid_alive(pid: int) -> bool:
+    if os.name == 'nt':
+        return True  # os.kill(pid, 0) would terminate the process on Windows; rely on the heartbeat lease
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True  # Exists but belongs to another user (or the platform cannot tell)
+    return True
+
+def remove_partials(output):
+    """Delete partial renders of `output` left behind by a crashed or killed worker."""
+    stem = Path(output).stem
+    # Also catches the raw soundtrack written next to a partial render
+    for stale in Path(output).parent.glob(f"{stem}.*.partial*"):
+        try:
+            stale.unlink()
+        except OSError:
+            pass
+
+def run_queue_worker(db_path, threads, backoff=30.0, lease=300.0, follow=False, cache_segments=False, chunks=1,
+                     poll=2.0):
+    """
+    Claim and render queue jobs until none are left (or forever with
+    `follow`), logging to its own file. Returns (done, failed, span records).
+    """
+    os.makedirs('./logs', exist_ok=True)
+    log_filename = f"./logs/queue_worker_{os.getpid()}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
+    logger = logging.getLogger(f"{__name__}.queue.{os.getpid()}")
+    logger.setLevel(logging.INFO)
+    file_handler = logging.FileHandler(log_filename, encoding='utf-8')
+    file_handler.setFormatter(logging.Formatter(
+        '%(asctime)s - %(levelname)s - %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S'
+    ))
+    logger.addHandler(file_handler)
 
+    job_queue = JobQueue(db_path)
+    done = failed = 0
+    try:
+        while True:
+            job_queue.recover(lease)
+            job = job_queue.claim()
+            if job is None:
+                if not follow and not job_queue.pending():
+                    return done, failed, spans.records
+                time.sleep(poll)
+                continue
+            if run_queue_job(job_queue, job, logger, threads, backoff, lease, cache_segments, chunks):
+                done += 1
+            elif job['attempts'] >= job['max_attempts']:
+                failed += 1
+    finally:
+        logger.removeHandler(file_handler)
+        file_handler.close()
+
+def run_queue_job(job_queue, job, logger, threads, backoff, lease, cache_segments=False, chunks=1):
+    """Render one claimed job while keeping its heartbeat fresh. Returns True on success."""
+    remove_partials(job['output'])
+    logger.info(f"Job {job['id']} attempt {job['attempts']}/{job['max_attempts']}: {job['output']}")
+    stop = threading.Event()
+
+    def beat():
+        while not stop.wait(lease / 3):
+            try:
+                if not job_queue.heartbeat(job['id'], job['worker']):
+                    logger.warning(f"Job {job['id']} was taken over by another worker after a missed heartbeat")
+                    return
+            except sqlite3.Error as e:
+                # A busy or briefly unavailable database must not end the heartbeat
+                logger.warning(f"Job {job['id']} heartbeat failed, retrying: {str(e)}")
+
+    heartbeat = threading.Thread(target=beat, daemon=True)
+    heartbeat.start()
+    try:
+        render_plan(json.loads(job['plan']), logger, threads=threads, draft=bool(job['draft']), output=job['output'],
+                    cache_segments=cache_segments, chunks=chunks)
+        if not job_queue.complete(job['id'], job['worker']):
+            logger.warning(f"Job {job['id']} finished, but another worker holds it now; leaving it to that worker")
+            return False
+        logger.info(f"Job {job['id']} done: {job['output']}")
+        return True
     except Exception as e:
-        logger.error(f"Error processing video: {str(e)}")
+        if job_queue.fail(job['id'], job['worker'], str(e), backoff):
+            logger.warning(f"Job {job['id']} failed, will retry: {str(e)}")
+        else:
+            logger.error(f"Job {job['id']} failed after {job['attempts']} attempt(s): {str(e)}")
+        return False
+    finally:
+        stop.set()
+        heartbeat.join()
+
+def run_queue_worker_process(db_path, threads, backoff, lease, follow, cache_segments, chunks):
+    """Entry point of a worker process started by `queue worker --workers N`."""
+    # Spans are handed back to the parent, which writes and aggregates them
+    spans.log_file = None
+    spans.records = []
+    spans.command = 'queue'
+    return run_queue_worker(db_path, threads, backoff, lease, follow, cache_segments, chunks)
+
+# Helper functions for the tidy command
+TIDY_JOURNAL = '.tidy_journal.jsonl'
+
+def plan_tidy(directory, index):
+    """
+    Scan a directory once and return (moves, short_names): moves are
+    (filename, target_dir) pairs; short_names lack the INDEX part.
+    """
+    moves, short_names = [], []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.name == TIDY_JOURNAL or not entry.is_file(follow_symlinks=False):
+                continue
+            parts = entry.name.split("_")
+            if len(parts) > index:
+                part = parts[index]
+                moves.append((entry.name, part.upper() if part.isalnum() else "#"))
+            else:
+                short_names.append(entry.name)
+    return moves, short_names
+
+def write_tidy_journal(journal, moves):
+    """Write the full move plan (one JSON line per move) before touching any file."""
+    tmp_journal = f"{journal}.tmp"
+    with open(tmp_journal, 'w', encoding='utf-8') as f:
+        f.writelines(json.dumps([name, target]) + "\n" for name, target in moves)
+    os.replace(tmp_journal, journal)
+
+def read_tidy_journal(journal):
+    with open(journal, 'r', encoding='utf-8') as f:
+        return [tuple(json.loads(line)) for line in f if line.strip()]
+
+def list_names(directory):
+    try:
+        with os.scandir(directory) as entries:
+            return {entry.name for entry in entries}
+    except FileNotFoundError:
+        return set()
+
+def execute_tidy(directory, moves, workers=8):
+    """
+    Apply a move plan. Same-filesystem moves are a plain os.rename; moves
+    that cross a device boundary are copied by a thread pool. Moves whose
+    source is gone and destination exists count as already done (resume).
+    Returns a dict of counters.
+    """
+    stats = defaultdict(int)
+    existing_dirs = {name for name in list_names(directory) if os.path.isdir(os.path.join(directory, name))}
+    target_names = {}
+    for target in {target for _, target in moves}:
+        if target in existing_dirs:
+            target_names[target] = list_names(os.path.join(directory, target))
+        else:
+            os.makedirs(os.path.join(directory, target), exist_ok=True)
+            target_names[target] = set()
+            stats['created_dirs'] += 1
+
+    cross_device = []
+    for name, target in moves:
+        src = os.path.join(directory, name)
+        dst = os.path.join(directory, target, name)
+        if name in target_names[target]:
+            if os.path.exists(src):
+                stats['conflicts'] += 1
+            else:
+                stats['already_done'] += 1
+            continue
+        try:
+            os.rename(src, dst)
+            stats['moved'] += 1
+        except FileNotFoundError:
+            stats['missing'] += 1
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            cross_device.append((src, dst))
+
+    if cross_device:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for _ in executor.map(lambda pair: shutil.move(*pair), cross_device):
+                stats['moved'] += 1
+                stats['copied'] += 1
+    return stats
+
+def rollback_tidy(directory, moves):
+    """Move every file of a journaled plan back to the top directory and drop emptied folders."""
+    restored = 0
+    for name, target in reversed(moves):
+        dst = os.path.join(directory, target, name)
+        src = os.path.join(directory, name)
+        if os.path.exists(dst) and not os.path.exists(src):
+            shutil.move(dst, src)
+            restored += 1
+    for target in {target for _, target in moves}:
+        try:
+            os.rmdir(os.path.join(directory, target))
+        except OSError:
+            pass  # Not empty or already gone
+    return restored
 
 # CLI Commands
 @click.group()
-def cli():
+@click.option('--profile', is_flag=True, help='Run under cProfile and write a .pstats file to ./logs')
+@click.pass_context
+def cli(ctx, profile):
     """Video processing toolkit with multiple commands."""
-    pass
+    spans.start(ctx.invoked_subcommand or 'cli')
+    profiler = None
+    if profile:
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    def finish():
+        if profiler:
+            profiler.disable()
+            stats_file = f"./logs/profile_{spans.command}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pstats"
+            profiler.dump_stats(stats_file)
+            click.echo(f"Profile written to: {stats_file}")
+        spans.report()
+
+    ctx.call_on_close(finish)
+
+def remix_options(command):
+    """Selection options shared by `remix` and `plan remix`."""
+    options = [
+        click.option('--min-duration', default=60, help='Minimum duration in seconds (default: 60)'),
+        click.option('--max-duration', default=120, help='Maximum duration in seconds (default: 120)'),
+        click.option('--extensions', default='mp4,avi,mov,mkv', help='Video file extensions to process (comma-separated)'),
+        click.option('--engine', type=click.Choice(['moviepy', 'copy']), default='moviepy',
+                     help='Render engine: moviepy re-encodes with speed variation, copy stream-copies keyframe-aligned cuts'),
+        click.option('--avoid-reuse', is_flag=True,
+                     help='Skip footage used by earlier remix runs and remember this run\'s segments'),
+        click.option('--reuse-expiry', default=30.0, help='Forget used segments after this many days (0 = never, default: 30)'),
+        click.option('--analyze', is_flag=True,
+                     help='Skip blank/static footage and keep segments inside one shot (cached low-res analysis)'),
+    ]
+    for option in reversed(options):
+        command = option(command)
+    return command
 
-@cli.command()
-@click.argument('input_folder')
-@click.argument('output_directory')
-@click.option('--min-duration', default=60, help='Minimum duration in seconds (default: 60)')
-@click.option('--max-duration', default=120, help='Maximum duration in seconds (default: 120)')
-@click.option('--extensions', default='mp4,avi,mov,mkv', help='Video file extensions to process (comma-separated)')
-def remix(input_folder, output_directory, min_duration, max_duration, extensions):
-    """Create a video from random segments with speed variations and overlap prevention."""
+def find_input_videos(input_folder, extensions):
+    """Video files of a remix input folder, or None (after reporting why) if there are none."""
     input_folder = Path(input_folder).resolve()
 
     if not input_folder.exists():
         click.echo(f"Error: Input folder does not exist: {input_folder}", err=True)
-        return
+        return None
 
     # Parse extensions
     video_extensions = tuple(f'.{ext.strip().lower()}' for ext in extensions.split(','))
@@ -444,6 +2749,24 @@ def remix(input_folder, output_directory, min_duration, max_duration, extensions
 
     if not input_videos:
         click.echo(f"Error: No video files found in {input_folder}", err=True)
+        return None
+    return input_videos
+
+@cli.command()
+@click.argument('input_folder')
+@click.argument('output_directory')
+@remix_options
+@click.option('--max-decoders', default=4, type=click.IntRange(min=1),
+              help='Maximum number of source decoders kept open at once (default: 4)')
+@click.option('--cache-segments', is_flag=True,
+              help='Reuse encoded segments from ./cache/segments and stitch them with stream copy')
+@click.option('--chunks', default=1, type=click.IntRange(min=1),
+              help='Encode the timeline as N GOP-aligned chunks in parallel ffmpeg processes, joined by stream copy (default: 1)')
+def remix(input_folder, output_directory, min_duration, max_duration, extensions, engine, avoid_reuse, reuse_expiry,
+          analyze, max_decoders, cache_segments, chunks):
+    """Create a video from random segments with speed variations and overlap prevention."""
+    input_videos = find_input_videos(input_folder, extensions)
+    if not input_videos:
         return
 
     click.echo(f"Found {len(input_videos)} video files:")
@@ -452,6 +2775,7 @@ def remix(input_folder, output_directory, min_duration, max_duration, extensions
 
     click.echo(f"Target duration: {min_duration}-{max_duration} seconds")
     click.echo(f"Output directory: {output_directory}")
+    click.echo(f"Engine: {engine}")
 
     try:
         # Setup logging for the processor
@@ -466,7 +2790,10 @@ def remix(input_folder, output_directory, min_duration, max_duration, extensions
         )
         os.makedirs('./logs', exist_ok=True)
 
-        processor = VideoProcessor((min_duration, max_duration))
+        segment_store = UsedSegmentStore(expiry_days=reuse_expiry) if avoid_reuse else None
+        processor = VideoProcessor((min_duration, max_duration), engine=engine, segment_store=segment_store,
+                                   max_open_readers=max_decoders, scene_index=SceneIndex() if analyze else None,
+                                   segment_cache=get_segment_cache() if cache_segments else None, chunks=chunks)
         output_file = processor.create_video(input_videos, output_directory)
         click.echo(f"Successfully created remix video: {output_file}")
 
@@ -475,68 +2802,212 @@ def remix(input_folder, output_directory, min_duration, max_duration, extensions
 
 @cli.command()
 @click.option('--config', '-c', required=True, help='Path to JSON configuration file')
-def generate(config):
+@click.option('--jobs', '-j', default=1, type=click.IntRange(min=1),
+              help='Number of videos to render in parallel; encoder threads per job = CPU cores // jobs (default: 1)')
+@click.option('--backend', type=click.Choice(['moviepy', 'ffmpeg']), default=None,
+              help='Render backend: moviepy (default) or a single-pass ffmpeg filter graph; overrides "backend" in the config')
+@click.option('--cache-segments', is_flag=True,
+              help='Reuse encoded segments from ./cache/segments and stitch them with stream copy')
+@click.option('--chunks', default=1, type=click.IntRange(min=1),
+              help='Encode the timeline as N GOP-aligned chunks in parallel ffmpeg processes, joined by stream copy (default: 1)')
+def generate(config, jobs, backend, cache_segments, chunks):
     """Generate video from configuration file."""
     logger = setup_logging()
-    set_imagemagick_path()
 
     try:
         with open(config, "r", encoding="utf-8") as config_file:
             config_data = json.load(config_file)
 
-        if "videos" in config_data:
-            for i, video_config in enumerate(config_data["videos"], 1):
-                repeat = video_config.get("repeat", 1)
-                for j in range(repeat):
-                    edit_video(video_config, logger, j + 1)
+        units = config_units(config_data)
+        jobs = min(jobs, len(units))
+        threads = encoder_threads_per_job(jobs)
+        logger.info(f"Running {len(units)} job(s), {jobs} at a time with {threads} encoder thread(s) each")
+
+        results = []
+        if jobs == 1:
+            for video_config, iteration, job_id in units:
+                start = time.perf_counter()
+                output = edit_video(video_config, logger, iteration, threads=threads, backend=backend,
+                                    cache_segments=cache_segments, chunks=chunks)
+                results.append((job_id, iteration, output, time.perf_counter() - start, None))
         else:
-            edit_video(config_data, logger)
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                futures = {
+                    executor.submit(run_generate_job, video_config, iteration, job_id, threads, backend,
+                                    cache_segments, chunks): (job_id, iteration)
+                    for video_config, iteration, job_id in units
+                }
+                for future in as_completed(futures):
+                    job_id, iteration = futures[future]
+                    try:
+                        output, elapsed, log_filename, job_spans = future.result()
+                        for record in job_spans:
+                            spans.add(record)
+                    except Exception as e:
+                        logger.error(f"Job {job_id}.{iteration} crashed: {str(e)}")
+                        output, elapsed, log_filename = None, 0.0, None
+                    status = "done" if output else "FAILED"
+                    logger.info(f"Job {job_id}.{iteration} {status} in {elapsed:.1f}s (log: {log_filename})")
+                    results.append((job_id, iteration, output, elapsed, log_filename))
+
+        failed = [r for r in results if not r[2]]
+        logger.info(f"Summary: {len(results) - len(failed)} succeeded, {len(failed)} failed")
+        for job_id, iteration, _, _, log_filename in sorted(failed):
+            logger.error(f"  Failed: video {job_id}, iteration {iteration}" + (f" (see {log_filename})" if log_filename else ""))
 
     except Exception as e:
         logger.error(f"Error processing JSON configuration: {str(e)}")
         click.echo(f"Error: {str(e)}", err=True)
 
+@cli.group('plan')
+def plan_commands():
+    """Write edit decision lists (JSON) to review, edit and render later."""
+    pass
+
+@plan_commands.command('generate')
+@click.option('--config', '-c', required=True, help='Path to JSON configuration file')
+@click.option('--plan-dir', '-o', default='./plans', help='Directory for the plan files (default: ./plans)')
+@click.option('--backend', type=click.Choice(['moviepy', 'ffmpeg']), default=None,
+              help='Render backend recorded in the plans; overrides "backend" in the config')
+def plan_generate_command(config, plan_dir, backend):
+    """Plan every video of a generate configuration without rendering."""
+    logger = setup_logging()
+
+    try:
+        with open(config, "r", encoding="utf-8") as config_file:
+            config_data = json.load(config_file)
+
+        for video_config, iteration, job_id in config_units(config_data):
+            plan = plan_generate(video_config, logger, iteration, job_id=job_id, backend=backend)
+            if plan is None:
+                continue
+            plan_file = os.path.join(plan_dir, f"{Path(plan['output']).stem}.json")
+            save_plan(plan, plan_file)
+            click.echo(f"Plan written to: {plan_file} ({len(plan['segments'])} segments, "
+                       f"{plan_duration(plan):.1f}s)")
+
+    except Exception as e:
+        logger.error(f"Error planning JSON configuration: {str(e)}")
+        click.echo(f"Error: {str(e)}", err=True)
+
+@plan_commands.command('remix')
+@click.argument('input_folder')
+@click.argument('output_directory')
+@remix_options
+@click.option('--plan-dir', '-o', default='./plans', help='Directory for the plan file (default: ./plans)')
+def plan_remix_command(input_folder, output_directory, min_duration, max_duration, extensions, engine, avoid_reuse,
+                       reuse_expiry, analyze, plan_dir):
+    """Pick remix segments and write them as a plan without rendering."""
+    input_videos = find_input_videos(input_folder, extensions)
+    if not input_videos:
+        return
+
+    logger = setup_logging()
+    try:
+        segment_store = UsedSegmentStore(expiry_days=reuse_expiry) if avoid_reuse else None
+        processor = VideoProcessor((min_duration, max_duration), engine=engine, segment_store=segment_store,
+                                   scene_index=SceneIndex() if analyze else None)
+        plan = processor.plan_video(input_videos, output_directory)
+        plan_file = os.path.join(plan_dir, f"{Path(plan['output']).stem}.json")
+        save_plan(plan, plan_file)
+        click.echo(f"Plan written to: {plan_file} ({len(plan['segments'])} segments, {plan_duration(plan):.1f}s)")
+
+    except Exception as e:
+        logger.error(f"Error planning remix: {str(e)}")
+        click.echo(f"Error: {str(e)}", err=True)
+
+@cli.command('render')
+@click.argument('plan_files', nargs=-1, required=True)
+@click.option('--draft', is_flag=True,
+              help=f'Quick review render: {DRAFT_SIZE}p, fastest preset, no cut history (output: <name>_draft.mp4)')
+@click.option('--output', '-o', default=None, help='Output filename (single plan only; default: the plan\'s output)')
+@click.option('--threads', default=0, help='Number of encoding threads (default: 0 = automatic)')
+@click.option('--max-decoders', default=4, type=click.IntRange(min=1),
+              help='Maximum number of source decoders kept open at once for remix plans (default: 4)')
+@click.option('--cache-segments', is_flag=True,
+              help='Reuse encoded segments from ./cache/segments and stitch them with stream copy')
+@click.option('--chunks', default=1, type=click.IntRange(min=1),
+              help='Encode the timeline as N GOP-aligned chunks in parallel ffmpeg processes, joined by stream copy (default: 1)')
+def render_command(plan_files, draft, output, threads, max_decoders, cache_segments, chunks):
+    """Render edit decision lists written by the plan commands."""
+    if output and len(plan_files) > 1:
+        click.echo("Error: --output can only be used with a single plan", err=True)
+        return
+
+    logger = setup_logging()
+    failed = 0
+    for plan_file in plan_files:
+        try:
+            plan = load_plan(plan_file)
+            output_filename = render_plan(plan, logger, threads=threads, draft=draft, output=output,
+                                          max_decoders=max_decoders, cache_segments=cache_segments, chunks=chunks)
+            click.echo(f"Rendered {plan_file} to: {output_filename}")
+        except Exception as e:
+            failed += 1
+            logger.error(f"Error rendering {plan_file}: {str(e)}")
+    if failed:
+        click.echo(f"Error: {failed} of {len(plan_files)} plan(s) failed", err=True)
+
 @cli.command()
 @click.argument('directory')
 @click.argument('index', type=int)
 @click.option('--dry-run', is_flag=True, help='Show what would be done without actually moving files')
-def tidy(directory, index, dry_run):
+@click.option('--resume', is_flag=True, help='Finish an interrupted run from its journal')
+@click.option('--rollback', is_flag=True, help='Undo an interrupted run from its journal')
+@click.option('--workers', default=8, help='Threads for cross-device copies (default: 8)')
+def tidy(directory, index, dry_run, resume, rollback, workers):
     """Organize files in directory by splitting filename on '_' and using INDEX part."""
     if not os.path.exists(directory):
         click.echo(f"Error: Directory '{directory}' does not exist.", err=True)
         return
 
-    def path(dr, f):
-        return os.path.join(dr, f)
+    journal = os.path.join(directory, TIDY_JOURNAL)
+    if (resume or rollback) and not os.path.exists(journal):
+        click.echo(f"Error: No journal found at '{journal}'.", err=True)
+        return
+    if not (resume or rollback or dry_run) and os.path.exists(journal):
+        click.echo(f"Error: A previous tidy run was interrupted ('{journal}'). Use --resume or --rollback.", err=True)
+        return
 
-    moved_count = 0
+    if rollback:
+        restored = rollback_tidy(directory, read_tidy_journal(journal))
+        os.remove(journal)
+        click.echo(f"Rolled back {restored} files.")
+        return
 
-    for f in os.listdir(directory):
-        fsrc = path(directory, f)
-        if os.path.isfile(fsrc):
-            parts = f.split("_")
-            click.echo(f"File: {f} -> Parts: {parts}")
+    if resume:
+        moves = read_tidy_journal(journal)
+        short_names = []
+    else:
+        with spans.span('plan') as record:
+            moves, short_names = plan_tidy(directory, index)
+            record['files'] = len(moves)
 
-            if len(parts) > index:
-                s = parts[index]
-                target_dir = s.upper() if s.isalnum() else "#"
-                target = path(directory, target_dir)
-
-                if dry_run:
-                    click.echo(f"Would move: {fsrc} -> {path(target, f)}")
-                else:
-                    if not os.path.exists(target):
-                        os.makedirs(target)
-                        click.echo(f"Created directory: {target}")
-
-                    shutil.move(fsrc, path(target, f))
-                    click.echo(f"Moved: {f} -> {target_dir}/")
-                    moved_count += 1
-            else:
-                click.echo(f"Warning: File '{f}' doesn't have enough parts (index {index})")
+    per_target = defaultdict(int)
+    for _, target in moves:
+        per_target[target] += 1
+
+    click.echo(f"Planned {len(moves)} moves into {len(per_target)} folders.")
+    if short_names:
+        click.echo(f"Warning: {len(short_names)} files don't have enough parts (index {index}), e.g. '{short_names[0]}'")
+
+    if dry_run:
+        for target, count in sorted(per_target.items()):
+            click.echo(f"  Would move {count} files -> {target}/")
+        return
 
-    if not dry_run:
-        click.echo(f"Successfully moved {moved_count} files.")
+    if not resume:
+        write_tidy_journal(journal, moves)
+
+    with spans.span('move', files=len(moves)):
+        stats = execute_tidy(directory, moves, workers)
+    if stats['conflicts'] or stats['missing']:
+        click.echo(f"Warning: {stats['conflicts']} files left in place (name exists in target), "
+                   f"{stats['missing']} planned files were missing.")
+    os.remove(journal)
+    click.echo(f"Successfully moved {stats['moved']} files "
+               f"({stats['copied']} across devices, {stats['already_done']} already done, "
+               f"{stats['created_dirs']} folders created).")
 
 @cli.command()
 @click.argument('video_file')
@@ -547,7 +3018,9 @@ def tidy(directory, index, dry_run):
 @click.option('--preset', default='veryfast', help='Encoding preset')
 @click.option('--fps', default=24, help='Output FPS')
 @click.option('--threads', default=4, help='Number of encoding threads')
-def bookmarks(video_file, playlist_file, output, codec, quality, preset, fps, threads):
+@click.option('--chunks', default=1, type=click.IntRange(min=1),
+              help='Encode the timeline as N GOP-aligned chunks in parallel ffmpeg processes, joined by stream copy (default: 1)')
+def bookmarks(video_file, playlist_file, output, codec, quality, preset, fps, threads, chunks):
     """Edit video using bookmark times from XSPF playlist file."""
     if not os.path.exists(video_file):
         click.echo(f"Error: Video file '{video_file}' not found.", err=True)
@@ -575,32 +3048,73 @@ def bookmarks(video_file, playlist_file, output, codec, quality, preset, fps, th
 
         click.echo(f"Found {len(cuts)} cuts: {cuts}")
 
-        # Load and process video
-        video = mpy.VideoFileClip(video_file)
-
-        # Remove duplicates and create clips
-        unique_cuts = list(set(cuts))
-        clips = [video.subclip(float(cut[0]), float(cut[1])) for cut in unique_cuts]
-
-        # Concatenate clips
-        final_clip = mpy.concatenate_videoclips(clips)
+        # Validate cuts against cached metadata before opening the decoder
+        info = probe_media(video_file)
+        unique_cuts = [
+            cut for cut in set(cuts)
+            if 0 <= float(cut[0]) < float(cut[1]) <= info['duration']
+        ]
+        if len(unique_cuts) < len(set(cuts)):
+            click.echo(f"Skipping {len(set(cuts)) - len(unique_cuts)} cut(s) outside 0-{info['duration']:.2f}s")
+        if not unique_cuts:
+            click.echo("Error: No valid cuts found in playlist.", err=True)
+            return
 
         # Ensure output directory exists
         os.makedirs(os.path.dirname(output) if os.path.dirname(output) else '.', exist_ok=True)
 
-        # Write video file
-        click.echo(f"Writing to: {output}")
-        final_clip.write_videofile(
-            output,
-            threads=threads,
-            fps=fps,
-            codec=codec,
-            preset=preset,
-            ffmpeg_params=["-crf", quality]
-        )
-
-        video.close()
-        final_clip.close()
+        if chunks > 1:
+            # The cuts as an EDL: the video is encoded in parallel chunks, the
+            # source audio of every cut is joined once in the stitch pass
+            plan = {
+                'fps': fps,
+                'size': [info['width'], info['height']],
+                'segments': [plan_segment(video_file, float(cut[0]), float(cut[1])) for cut in unique_cuts],
+                'rotation': "none",
+                'logo': None,
+                'audio': None,
+                'encode': {'codec': codec, 'preset': preset, 'crf': quality},
+            }
+            audio = ([], [])
+            if info['has_audio']:
+                inputs = []
+                for seg in plan['segments']:
+                    inputs += ['-ss', f"{seg['in']:.6f}", '-t', f"{seg['out'] - seg['in']:.6f}", '-vn', '-i', seg['source']]
+                labels = ''.join(f"[{i}:a:0]" for i in range(1, len(unique_cuts) + 1))
+                audio = (inputs, ['-filter_complex', f"{labels}concat=n={len(unique_cuts)}:v=0:a=1[aout]",
+                                  '-map', '[aout]', '-c:a', 'aac', '-shortest'])
+            click.echo(f"Writing to: {output} in {chunks} chunks")
+            with spans.span('chunked_render', frames=int(plan_duration(plan) * fps)) as record:
+                record['chunks'] = render_plan_chunked(plan, output, threads, chunks, audio=audio)
+                record['bytes'] = output_size(output)
+        else:
+            # Load and process video
+            with spans.span('load_video', path=video_file):
+                video = mpy.VideoFileClip(video_file, audio=info['has_audio'])
+
+            # Create clips
+            clips = [video.subclip(float(cut[0]), float(cut[1])) for cut in unique_cuts]
+
+            # Concatenate clips
+            with spans.span('concatenate', clips=len(clips)):
+                final_clip = mpy.concatenate_videoclips(clips)
+
+            # Write video file
+            click.echo(f"Writing to: {output}")
+            with spans.span('encode', frames=int(final_clip.duration * fps)) as record:
+                final_clip.write_videofile(
+                    output,
+                    threads=threads,
+                    fps=fps,
+                    codec=codec,
+                    preset=preset,
+                    ffmpeg_params=["-crf", quality]
+                )
+                record['bytes'] = output_size(output)
+
+            video.close()
+            final_clip.close()
+        record_cuts([(video_file, float(cut[0]), float(cut[1]), 1.0) for cut in unique_cuts], output, 'bookmarks')
 
         click.echo("Video processing completed successfully!")
 
@@ -614,7 +3128,13 @@ def bookmarks(video_file, playlist_file, output, codec, quality, preset, fps, th
 @click.option('--bottom', '-b', default=30, help='Height of bottom black bar (default: 30px)')
 @click.option('--cut-start', '-s', default=0.0, help='Duration to cut from beginning in seconds')
 @click.option('--cut-end', '-e', default=0.0, help='Duration to cut from end in seconds')
-def letterbox(input_file, output_file, top, bottom, cut_start, cut_end):
+@click.option('--codec', default='libx264', help='Video codec')
+@click.option('--quality', default='23', help='Video quality (CRF value)')
+@click.option('--preset', default='medium', help='Encoding preset')
+@click.option('--threads', default=0, help='Number of encoding threads (default: 0 = automatic)')
+@click.option('--chunks', default=1, type=click.IntRange(min=1),
+              help='Encode the timeline as N GOP-aligned chunks in parallel ffmpeg processes, joined by stream copy (default: 1)')
+def letterbox(input_file, output_file, top, bottom, cut_start, cut_end, codec, quality, preset, threads, chunks):
     """Add black bars to video and optionally trim from start/end."""
     if not os.path.exists(input_file):
         click.echo(f"Error: Input file '{input_file}' not found.", err=True)
@@ -626,50 +3146,234 @@ def letterbox(input_file, output_file, top, bottom, cut_start, cut_end):
         click.echo(f"Adding {top}px top bar and {bottom}px bottom bar")
         click.echo(f"Cutting {cut_start}s from start and {cut_end}s from end")
 
-        # Load the video file
-        video = VideoFileClip(input_file)
+        # Read duration and dimensions from cached metadata
+        info = probe_media(input_file)
+        if cut_start + cut_end >= info['duration']:
+            click.echo(f"Error: Cutting {cut_start + cut_end}s leaves nothing of a {info['duration']:.2f}s video.", err=True)
+            return
+        if top + bottom >= info['height']:
+            click.echo(f"Error: Bars of {top + bottom}px cover the whole {info['height']}px frame.", err=True)
+            return
 
-        # Cut the specified duration from the beginning and end
-        if cut_start > 0 or cut_end > 0:
-            start = cut_start
-            end = video.duration - cut_end if cut_end > 0 else None
-            video = video.subclip(start, end)
+        # Ensure output directory exists
+        os.makedirs(os.path.dirname(output_file) if os.path.dirname(output_file) else '.', exist_ok=True)
 
-        # Get the dimensions
-        width, height = video.size
+        bars = []
+        if top > 0:
+            bars.append(f"drawbox=x=0:y=0:w=iw:h={top}:color=black:t=fill")
+        if bottom > 0:
+            bars.append(f"drawbox=x=0:y=ih-{bottom}:w=iw:h={bottom}:color=black:t=fill")
+        duration = info['duration'] - cut_start - cut_end
+        if chunks > 1:
+            # Video chunks seek to their first frame; the audio is stream copied once in the stitch pass
+            fps = info['fps']
+
+            def encode_chunk(start, end, path, chunk_threads, gop):
+                chunk_args = [FFMPEG_BINARY, '-hide_banner', '-loglevel', 'error', '-y',
+                              '-ss', f"{cut_start + start / fps:.6f}", '-i', input_file,
+                              '-frames:v', str(end - start), '-map', '0:v:0', '-an']
+                if bars:
+                    chunk_args += ['-vf', ','.join(bars)]
+                chunk_args += ['-c:v', codec, '-crf', str(quality), '-preset', preset, '-threads', str(chunk_threads),
+                               '-g', str(gop), '-flags', '+cgop', path]
+                subprocess.run(chunk_args, check=True)
+
+            audio = ([], [])
+            if info['has_audio']:
+                audio = (['-ss', f"{cut_start:.6f}", '-t', f"{duration:.6f}", '-i', input_file],
+                         ['-map', '1:a:0', '-c:a', 'copy'])
+            with spans.span('chunked_render', frames=int(duration * fps)) as record:
+                record['chunks'] = encode_chunked(encode_chunk, max(1, round(duration * fps)), fps, chunks,
+                                                  output_file, threads, audio=audio)
+                record['bytes'] = output_size(output_file)
+            click.echo(f"Encoded {record['chunks']} chunks in parallel")
+            click.echo("Video processing completed successfully!")
+            return
+
+        # One native pass: input-side seek, bars drawn in place, audio stream copied
+        args = [FFMPEG_BINARY, '-hide_banner', '-loglevel', 'error', '-stats', '-y']
+        if cut_start > 0:
+            args += ['-ss', f"{cut_start:.6f}"]
+        args += ['-i', input_file, '-t', f"{info['duration'] - cut_start - cut_end:.6f}", '-map', '0:v:0']
+        if info['has_audio']:
+            args += ['-map', '0:a:0', '-c:a', 'copy']
+        if bars:
+            args += ['-vf', ','.join(bars)]
+        args += ['-c:v', codec, '-crf', str(quality), '-preset', preset, '-threads', str(threads),
+                 '-movflags', '+faststart', output_file]
+        with spans.span('ffmpeg_render', frames=int(duration * info['fps'])) as record:
+            subprocess.run(args, check=True)
+            record['bytes'] = output_size(output_file)
 
-        # Create black bars
-        top_bar = ColorClip(size=(width, top), color=(0,0,0)).set_duration(video.duration)
-        bottom_bar = ColorClip(size=(width, bottom), color=(0,0,0)).set_duration(video.duration)
+        click.echo("Video processing completed successfully!")
 
-        # Position the bars
-        top_bar = top_bar.set_position(('center', 'top'))
-        bottom_bar = bottom_bar.set_position(('center', 'bottom'))
+    except Exception as e:
+        click.echo(f"Error processing video: {str(e)}", err=True)
 
-        # Create the final composite
-        final_video = CompositeVideoClip([video, top_bar, bottom_bar])
-        final_video = final_video.set_duration(video.duration)
+@cli.command()
+@click.option('--dataset', '-d', default='./dataset.csv', help='Cut history CSV to analyze (default: ./dataset.csv)')
+@click.option('--relabel', '-r', default=None, help='Write a copy of the dataset with recomputed labels to this path')
+def analyze(dataset, relabel):
+    """Classify overlapping/contained cuts of every row in a cut history CSV."""
+    if not os.path.exists(dataset):
+        click.echo(f"Error: Dataset '{dataset}' not found.", err=True)
+        return
 
-        # Ensure output directory exists
-        os.makedirs(os.path.dirname(output_file) if os.path.dirname(output_file) else '.', exist_ok=True)
+    start = time.perf_counter()
+    with spans.span('load') as record:
+        starts, ends, labels, arrays = load_cut_dataset(dataset)
+        record['bytes'] = output_size(dataset)
+    with spans.span('classify', rows=len(labels)):
+        overlaps, contained = classify_cut_sets(starts, ends)
+    elapsed = time.perf_counter() - start
+
+    repeated = overlaps.any(axis=1)
+    new_labels = np.where(repeated, "Repeated", "Unique")
+    mismatched = int(np.count_nonzero(new_labels != labels))
+    valid_cuts = int(np.count_nonzero(~np.isnan(starts)))
+
+    click.echo(f"Analyzed {len(labels)} cut sets ({valid_cuts} cuts) in {elapsed:.2f}s")
+    click.echo(f"  Sets with overlapping cuts: {int(repeated.sum())}")
+    click.echo(f"  Overlapping cuts: {int(overlaps.sum())}")
+    click.echo(f"  Cuts contained in another cut: {int(contained.sum())}")
+    click.echo(f"  Stored labels that disagree: {mismatched}")
+
+    if relabel:
+        with open(relabel, 'w', encoding='utf-8', newline='') as f:
+            f.write("Array,Label\n")
+            f.writelines(f"{array},{label}\n" for array, label in zip(arrays, new_labels))
+        click.echo(f"Wrote relabeled dataset to: {relabel}")
+
+@cli.group()
+def history():
+    """Query and import the cut history store."""
+    pass
 
-        # Write the result
-        final_video.write_videofile(
-            output_file,
-            codec='libx264',
-            audio_codec='aac',
-            temp_audiofile='temp-audio.m4a',
-            remove_temp=True
-        )
+@history.command('import')
+@click.argument('csv_file')
+@click.option('--source', '-s', required=True, help='Source video the CSV cuts were taken from')
+def history_import(csv_file, source):
+    """Import a legacy dataset.csv into the cut history store."""
+    if not os.path.exists(csv_file):
+        click.echo(f"Error: CSV file '{csv_file}' not found.", err=True)
+        return
+    count = get_cut_history().import_csv(csv_file, source)
+    click.echo(f"Imported {count} cuts from {csv_file}")
+
+@history.command('used')
+@click.argument('source')
+@click.option('--start', default=0.0, help='Only show ranges ending after this time (seconds)')
+@click.option('--end', default=float('inf'), help='Only show ranges starting before this time (seconds)')
+def history_used(source, start, end):
+    """List the already used ranges of a source video."""
+    ranges = get_cut_history().used_ranges(source, start, end)
+    for range_start, range_end in ranges:
+        click.echo(f"{range_start:10.2f}s - {range_end:10.2f}s")
+    click.echo(f"{len(ranges)} used range(s)")
+
+@cli.group()
+def queue():
+    """Durable render queue for long batch runs (./cache/jobs.sqlite)."""
+    pass
 
-        # Cleanup
-        video.close()
-        final_video.close()
+@queue.command('enqueue')
+@click.argument('plan_files', nargs=-1)
+@click.option('--config', '-c', default=None, help='Plan every video of a generate configuration and queue the plans')
+@click.option('--backend', type=click.Choice(['moviepy', 'ffmpeg']), default=None,
+              help='Render backend for --config plans; overrides "backend" in the config')
+@click.option('--draft', is_flag=True, help='Queue draft renders instead of full ones')
+@click.option('--max-attempts', default=3, type=click.IntRange(min=1), help='Attempts per job before it fails (default: 3)')
+def queue_enqueue(plan_files, config, backend, draft, max_attempts):
+    """Queue plan files (from the plan commands) and/or a generate configuration."""
+    if not plan_files and not config:
+        click.echo("Error: give plan files and/or --config", err=True)
+        return
 
-        click.echo("Video processing completed successfully!")
+    logger = setup_logging()
+    try:
+        plans = [load_plan(plan_file) for plan_file in plan_files]
+        if config:
+            with open(config, "r", encoding="utf-8") as config_file:
+                config_data = json.load(config_file)
+            for video_config, iteration, job_id in config_units(config_data):
+                plan = plan_generate(video_config, logger, iteration, job_id=job_id, backend=backend)
+                if plan is not None:
+                    plans.append(plan)
+
+        ids = JobQueue().enqueue(plans, draft=draft, max_attempts=max_attempts)
+        if ids:
+            click.echo(f"Queued {len(ids)} job(s): {ids[0]}-{ids[-1]}")
+        else:
+            click.echo("Nothing to queue")
 
     except Exception as e:
-        click.echo(f"Error processing video: {str(e)}", err=True)
+        logger.error(f"Error queueing jobs: {str(e)}")
+        click.echo(f"Error: {str(e)}", err=True)
+
+@queue.command('worker')
+@click.option('--workers', '-w', default=1, type=click.IntRange(min=1),
+              help='Worker processes; encoder threads per worker = CPU cores // workers (default: 1)')
+@click.option('--backoff', default=30.0, help='Seconds before the first retry of a failed job, doubled per attempt (default: 30)')
+@click.option('--lease', default=300.0,
+              help='Requeue running jobs without a heartbeat for this many seconds (default: 300)')
+@click.option('--follow', is_flag=True, help='Keep polling for new jobs instead of exiting when the queue is empty')
+@click.option('--cache-segments', is_flag=True,
+              help='Reuse encoded segments from ./cache/segments and stitch them with stream copy')
+@click.option('--chunks', default=1, type=click.IntRange(min=1),
+              help='Encode the timeline as N GOP-aligned chunks in parallel ffmpeg processes, joined by stream copy (default: 1)')
+def queue_worker(workers, backoff, lease, follow, cache_segments, chunks):
+    """Render queued jobs until the queue is empty; safe to kill and restart at any time."""
+    setup_logging()
+    job_queue = JobQueue()
+    recovered = job_queue.recover(lease)
+    if recovered:
+        click.echo(f"Requeued {recovered} job(s) left running by a lost worker")
+
+    threads = encoder_threads_per_job(workers)
+    if workers == 1:
+        done, failed, _ = run_queue_worker(job_queue.db_path, threads, backoff, lease, follow, cache_segments, chunks)
+    else:
+        done = failed = 0
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(run_queue_worker_process, job_queue.db_path, threads, backoff, lease, follow,
+                                cache_segments, chunks)
+                for _ in range(workers)
+            ]
+            for future in as_completed(futures):
+                try:
+                    worker_done, worker_failed, worker_spans = future.result()
+                except Exception as e:
+                    click.echo(f"Error: worker crashed: {str(e)}", err=True)
+                    continue
+                done += worker_done
+                failed += worker_failed
+                for record in worker_spans:
+                    spans.add(record)
+
+    click.echo(f"Workers finished: {done} job(s) done, {failed} failed")
+
+@queue.command('status')
+@click.option('--all', 'show_all', is_flag=True, help='Also list finished jobs')
+@click.option('--retry-failed', is_flag=True, help='Give failed jobs a fresh set of attempts')
+def queue_status(show_all, retry_failed):
+    """Show job counts and the queued, running and failed jobs."""
+    job_queue = JobQueue()
+    if retry_failed:
+        click.echo(f"Requeued {job_queue.retry_failed()} failed job(s)")
+
+    counts = job_queue.counts()
+    click.echo("  ".join(f"{state}: {counts.get(state, 0)}" for state in ('queued', 'running', 'done', 'failed')))
+    states = ('queued', 'running', 'done', 'failed') if show_all else ('queued', 'running', 'failed')
+    for job in job_queue.jobs(states):
+        line = f"{job['id']:>6}  {job['state']:<8} {job['attempts']}/{job['max_attempts']}  {job['output']}"
+        if job['state'] == 'queued' and job['not_before'] > time.time():
+            line += f"  (retry in {job['not_before'] - time.time():.0f}s)"
+        elif job['state'] == 'running':
+            line += f"  ({job['worker']})"
+        if job['error'] and job['state'] != 'done':
+            line += f"\n        {job['error']}"
+        click.echo(line)
 
 if __name__ == "__main__":
     cli()
@@ -1,6 +1,8 @@
 
 import random
 
+import numpy as np
+
 
 # def classify_tuples(arr):
 #     # Sort the array of tuples based on the start of each interval
@@ -21,36 +23,84 @@ import random
 #     return result
 
 
-def classify_tuples(arr):
-    # Create a list of events, each represented as a tuple (start, end, index, type)
-    events = []
-    for i, (start, end) in enumerate(arr):
-        events.append((start, i, "start"))
-        events.append((end, i, "end"))
+def classify_cut_sets(starts, ends):
+    """
+    Classify every cut of many cut sets at once.
+
+    starts/ends are (n_sets, k) arrays; ragged sets are padded with NaN.
+    Each row is sorted by (start, -end), a running max of the previous
+    ends (cummax) tells whether a cut starts before an earlier one ended
+    (overlap) or ends before it (containment), and the next start tells
+    whether a later cut begins inside it. Touching cuts do not overlap.
+
+    Returns two boolean (n_sets, k) arrays in the input order:
+    overlaps (shares time with any other cut) and contained (lies inside
+    another cut). Padding slots are False.
+    """
+    starts = np.atleast_2d(np.asarray(starts, dtype=np.float64))
+    ends = np.atleast_2d(np.asarray(ends, dtype=np.float64))
+    valid = ~(np.isnan(starts) | np.isnan(ends))
+    starts = np.where(valid, starts, np.inf)
+    ends = np.where(valid, ends, -np.inf)
+
+    order = np.lexsort((-ends, starts), axis=-1)
+    s = np.take_along_axis(starts, order, axis=-1)
+    e = np.take_along_axis(ends, order, axis=-1)
+
+    prev_max_end = np.empty_like(e)
+    prev_max_end[:, 0] = -np.inf
+    prev_max_end[:, 1:] = np.maximum.accumulate(e, axis=-1)[:, :-1]
+    next_start = np.full_like(s, np.inf)
+    next_start[:, :-1] = s[:, 1:]
+
+    contained_sorted = e <= prev_max_end
+    overlaps_sorted = (s < prev_max_end) | (next_start < e) | contained_sorted
 
-    # Sort the events based on their position on the sweep line
-    events.sort()
+    overlaps = np.empty_like(overlaps_sorted)
+    contained = np.empty_like(contained_sorted)
+    np.put_along_axis(overlaps, order, overlaps_sorted, axis=-1)
+    np.put_along_axis(contained, order, contained_sorted, axis=-1)
+    return overlaps & valid, contained & valid
 
-    # Initialize a result list to store the classification
-    result = [0] * len(arr)
 
-    # Keep track of the active intervals using a set
-    active_intervals = set()
+def classify_tuples(arr):
+    """Return 1 for every (start, end) tuple that overlaps another tuple in arr, else 0."""
+    if not arr:
+        return []
+    cuts = np.asarray(arr, dtype=np.float64)
+    overlaps, _ = classify_cut_sets(cuts[None, :, 0], cuts[None, :, 1])
+    return overlaps[0].astype(int).tolist()
+
 
-    # Use a dictionary to map tuple indices to their corresponding result indices
-    tuple_index_to_result_index = {i: idx for idx, i in enumerate(arr)}
+def load_cut_dataset(path):
+    """
+    Load a cut-history CSV ("[(start, end), ...]",Label per row) without eval.
 
-    for position, index, event_type in events:
-        if event_type == "start":
-            active_intervals.add(index)
-        elif event_type == "end":
-            active_intervals.remove(index)
-            # Check if the index is in the dictionary before performing the lookup
-            if index in tuple_index_to_result_index:
-                result[tuple_index_to_result_index[index]
-                       ] = 1 if active_intervals else 0
+    Returns (starts, ends, labels, arrays): NaN-padded (n_rows, k) float
+    arrays, the stored labels, and the raw quoted Array fields so rows can
+    be rewritten unchanged.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        lines = f.read().splitlines()[1:]
 
-    return result
+    strip = str.maketrans("", "", '"[]() ')
+    arrays, labels, rows = [], [], []
+    for line in lines:
+        if not line:
+            continue
+        array_field, _, label = line.rpartition(",")
+        arrays.append(array_field)
+        labels.append(label)
+        numbers = array_field.translate(strip)
+        rows.append(numbers.split(",") if numbers else [])
+
+    width = max((len(row) for row in rows), default=0)
+    values = np.full((len(rows), width), np.nan)
+    for length in {len(row) for row in rows}:
+        idx = [i for i, row in enumerate(rows) if len(row) == length]
+        if length:
+            values[idx, :length] = np.array([rows[i] for i in idx]).astype(np.float64)
+    return values[:, 0::2], values[:, 1::2], np.array(labels), arrays
 
 
 def is_all_zeros(array):
@@ -58,6 +108,34 @@ def is_all_zeros(array):
 
 
 def getrandomDuration(duration, length):
-    start = round(random.uniform(0, duration-length), 1)
-    end = start + length
+    start = round(random.uniform(0, max(0, duration-length)), 1)
+    end = min(start + length, duration)
     return start, end
+
+
+def sample_cuts(duration, count, length, min_gap=0.0, seed=None):
+    """
+    Place `count` non-overlapping cuts of `length` seconds in one pass.
+
+    The slack left after laying the cuts and gaps end to end is split at
+    `count` sorted random points, so every valid arrangement can come out
+    and no retries are needed. Cuts are returned in random order.
+    Raises ValueError when the cuts cannot fit in `duration`.
+    """
+    if count <= 0:
+        return []
+    if length <= 0:
+        raise ValueError(f"Cut length must be positive, got {length}")
+    slack = duration - count * length - (count - 1) * min_gap
+    if slack < 0:
+        raise ValueError(
+            f"Cannot fit {count} cuts of {length}s with {min_gap}s gaps "
+            f"in {duration:.2f}s (needs {duration - slack:.2f}s)"
+        )
+
+    rng = random.Random(seed)
+    offsets = sorted(rng.uniform(0, slack) for _ in range(count))
+    cuts = [(offset + i * (length + min_gap), offset + i * (length + min_gap) + length)
+            for i, offset in enumerate(offsets)]
+    rng.shuffle(cuts)
+    return cuts